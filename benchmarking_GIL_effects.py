@@ -6,15 +6,35 @@
 # Also see http://effbot.org/zone/wide-finder.htm
 
 # Execute with eg: $python benchmarking_GIL_effects.py funcToBench.py
+#             or: $python benchmarking_GIL_effects.py --warmup 10 --cpus 0-3 --json results.json funcToBench2.py
+#             or: $python benchmarking_GIL_effects.py --sweep funcToBench2.py funcToBench3.py
 
 '''
 Python uses a global interpreter lock to protect the interpreter internals from simultaneous access
 
-The following tests will call a given function one time, in one hundred loops.
-Iy then displays the best of 100 calls.
+The following tests will call a given function one time, in one hundred loops (after a few warm-up loops that aren't counted).
+It then displays the distribution of the 100 calls: the best, the median, the 95th and 99th percentiles, the standard deviation,
+and a 95% confidence interval for the median (see benchrunner.py).
+The best run alone hides how much the runs vary, and the outliers are what you notice in production.
+Use --json to keep every sample along with a description of the host, to compare runs across commits and machines,
+and --cpus to pin the benchmark to a set of CPUs.
 It cycles between a non-threaded iteration based call, a threaded call, and finally a processing module (fork and exec) call.
 It iterates each test for an increasing number of calls/threads. It will go through 1, 2, 4 and finally 8 calls/threads/processes.
 
+With --sweep, it goes from 1 worker up to twice the number of CPUs (or --max-workers), and adds
+a reused thread pool, a reused process pool, and processes started with each of the multiprocessing
+start methods (fork, forkserver, spawn; Python 3.4 and later).  For each mode it shows the speedup over
+the non-threaded run of the same number of calls, the parallel efficiency (speedup per worker),
+and fits Amdahl's and Gustafson's laws to the speedups (see benchrunner.py).  Several modules
+can be given, to compare workloads.
+
+The threaded and processes runs create, start and join new threads or processes on every call,
+so they time the setup as much as the work (funcToBench.py shows just the setup).  The pooled runs
+start their workers before the timing, and only hand out work and wait for it.  With --phases,
+each mode is also run with the phases timed separately: creating the workers, starting them,
+handing out the work, the work itself (from the first call of the function until the last one
+returned), joining the workers, and collecting the results.
+
 Why are we adding process results into this?
 The answer is simple: we know in advance the GIL is going to penalize our execution, and using it sidesteps the GIL entirely, allowing us to see how fast execution could be.
 
@@ -23,7 +43,7 @@ All examples use new-style classes to further even the playing field, although w
 
 To keep things simple, all of the timings in this are delegated to Python's timeit module.
 The timeit module is designed to benchmark pieces of Python code -- generally single statements.
-In our case however, it provides some nice facilities for looping over a given function a set number of times and returning to us the fastest run time.
+In our case however, it provides some nice facilities for looping over a given function a set number of times and returning to us the run times.
 
 NOTE:
 >Thread and process setup add linear overhead time as shown with funcToBench.py which establishes some baseline numbers so we see the overheads
@@ -57,82 +77,382 @@ This is why Jython and IronPython have no GIL. It was simply not needed and left
 Based on the numbers, switching to processes side-steps the entire GIL issue, allowing all of the children to run concurrently.
 '''
 
+from __future__ import print_function
+
+import time
 from threading import Thread
-from processing import Process
+try:
+    import multiprocessing
+    from multiprocessing import Process
+except ImportError:
+    multiprocessing = None
+    from processing import Process # Python 2.5, see README.md
+try:
+    import queue
+except ImportError:
+    import Queue as queue # Python 2
+
+import benchrunner
+
+# The phases are timed with the wall clock, since the work runs in other processes too
+wallclock = time.time
 
 class threads_object(Thread):
+    span = None
     def run(self):
+        t0 = wallclock()
         function_to_run()
+        self.span = t0, wallclock()
 
 class nothreads_object(object):
+    span = None
     def run(self):
+        t0 = wallclock()
         function_to_run()
+        self.span = t0, wallclock()
 
 class process_object(Process):
+    spans = None # a queue to send the time spent in function_to_run back on, with --phases
     def run(self):
+        t0 = wallclock()
         function_to_run()
+        if self.spans is not None:
+            self.spans.put((t0, wallclock()))
 
-def non_threaded(num_iter):
+def record(phases, spans, created, started, joined, t0):
+    # create: making the objects, start: starting them, run: from the first call to
+    # function_to_run until the last one returned, join: from then until all are joined
+    if phases is None:
+        return
+    first = min(span[0] for span in spans)
+    last = max(span[1] for span in spans)
+    phases.append({"create": created - t0, "start": started - created,
+                   "run": last - first, "join": joined - last, "total": joined - t0})
+
+def non_threaded(num_iter, phases=None):
+    t0 = wallclock()
     funcs = []
     for i in range(int(num_iter)):
         funcs.append(nothreads_object())
+    created = wallclock()
     for i in funcs:
         i.run()
+    done = wallclock()
+    record(phases, [i.span for i in funcs], created, created, done, t0)
 
-def threaded(num_threads):
+def threaded(num_threads, phases=None):
+    t0 = wallclock()
     funcs = []
     for i in range(int(num_threads)):
         funcs.append(threads_object())
+    created = wallclock()
     for i in funcs:
         i.start()
+    started = wallclock()
     for i in funcs:
         i.join()
+    joined = wallclock()
+    record(phases, [i.span for i in funcs], created, started, joined, t0)
 
-def processed(num_processes):
+def processed(num_processes, phases=None):
+    t0 = wallclock()
     funcs = []
     for i in range(int(num_processes)):
         funcs.append(process_object())
+    created = wallclock()
+    if phases is not None:
+        spans = multiprocessing.Queue()
+        for i in funcs:
+            i.spans = spans
+    for i in funcs:
+        i.start()
+    started = wallclock()
+    for i in funcs:
+        i.join()
+    joined = wallclock()
+    if phases is not None:
+        record(phases, [spans.get() for i in funcs], created, started, joined, t0)
+
+# Workers that are started once, before the timing, and wait for work.  Timing a call
+# then only measures handing out the work, the work itself, and collecting the results,
+# so what's left of the difference with non_threaded is the GIL (or the lack of it).
+def pool_worker(function, tasks, results):
+    while tasks.get() is not None:
+        t0 = wallclock()
+        function()
+        results.put((t0, wallclock()))
+
+def pool_process(module_name, tasks, results):
+    pool_worker(__import__(module_name).function_to_run, tasks, results)
+
+class pooled(object):
+    def __init__(self, num, module_name=None):
+        # threads, or processes if a module name is given
+        self.num = num
+        if module_name is None:
+            self.tasks, self.results = queue.Queue(), queue.Queue()
+            self.workers = [Thread(target=pool_worker,
+                                   args=(function_to_run, self.tasks, self.results))
+                            for i in range(num)]
+        else:
+            self.tasks, self.results = multiprocessing.Queue(), multiprocessing.Queue()
+            self.workers = [Process(target=pool_process,
+                                    args=(module_name, self.tasks, self.results))
+                            for i in range(num)]
+        for i in self.workers:
+            i.start()
+
+    def __call__(self, phases=None):
+        # dispatch: handing out the work, run: from the first call to function_to_run
+        # until the last one returned, collect: from then until all results are in
+        t0 = wallclock()
+        for i in range(self.num):
+            self.tasks.put(1)
+        dispatched = wallclock()
+        spans = [self.results.get() for i in range(self.num)]
+        done = wallclock()
+        if phases is not None:
+            last = max(span[1] for span in spans)
+            phases.append({"dispatch": dispatched - t0,
+                           "run": last - min(span[0] for span in spans),
+                           "collect": done - last, "total": done - t0})
+
+    def close(self):
+        for i in self.workers:
+            self.tasks.put(None)
+        for i in self.workers:
+            i.join()
+
+# The pools and the other start methods run the function in processes that may not have
+# run the __main__ block below, so they import the module themselves
+def call_function(i):
+    function_to_run()
+
+def call_module(module_name):
+    __import__(module_name).function_to_run()
+
+def processed_with(context, module_name, num_processes):
+    funcs = []
+    for i in range(int(num_processes)):
+        funcs.append(context.Process(target=call_module, args=(module_name,)))
     for i in funcs:
         i.start()
     for i in funcs:
         i.join()
 
+def start_methods():
+    if hasattr(multiprocessing, "get_all_start_methods"):
+        return multiprocessing.get_all_start_methods()
+    return []
+
+def available_cpus():
+    affinity = benchrunner.affinity()
+    if affinity:
+        return len(affinity)
+    return benchrunner.cpu_count() or 1
+
+def sweep_counts(limit):
+    # 1, 2, 4, ... up to limit, and the number of CPUs
+    counts = set([available_cpus()])
+    n = 1
+    while n <= limit:
+        counts.add(n)
+        n *= 2
+    return sorted(c for c in counts if c <= limit)
+
+def show_header():
+    print("%-27s %10s %10s %10s %10s %10s %23s" % (
+        "", "best", "median", "p95", "p99", "stddev", "median 95% CI"))
+
 def show_results(func_name, results):
-    print "%-23s %4.6f seconds" % (func_name, results)
+    print("%-27s %10.6f %10.6f %10.6f %10.6f %10.6f %10.6f - %10.6f" % (
+        func_name, results["min"], results["median"], results["p95"], results["p99"],
+        results["stddev"], results["median_ci95"][0], results["median_ci95"][1]))
+
+# mode name, label, and a function that takes the module name and the worker count, and
+# returns the function to time and a function to call when done (or None).  the function
+# to time takes a list to add the times of its phases to, if it has any.
+def unpooled(func):
+    return lambda m, n: (lambda phases=None: func(n, phases), None)
+
+def pooled_threads(module_name, num):
+    workers = pooled(num)
+    return workers, workers.close
+
+def pooled_processes(module_name, num):
+    workers = pooled(num, module_name)
+    return workers, workers.close
+
+MODES = [
+    ("non_threaded", "non_threaded (%s iters)", unpooled(non_threaded)),
+    ("threaded", "threaded (%s threads)", unpooled(threaded)),
+    ("processed", "processes (%s procs)", unpooled(processed)),
+    ("pooled_threads", "pooled (%s threads)", pooled_threads),
+    ("pooled_processes", "pooled (%s procs)", pooled_processes),
+    ]
+
+PHASES = ["create", "start", "dispatch", "run", "join", "collect", "total"]
+
+def show_phases(func_name, phases):
+    # median time of each phase
+    print("%-27s" % func_name + "".join(
+        phase in phases and " %10.6f" % phases[phase]["median"] or " %10s" % "-"
+        for phase in PHASES))
+
+def thread_pool(module_name, num):
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(num)
+    return lambda phases=None: pool.map(call_function, range(num)), pool.terminate
+
+def process_pool(context):
+    def make(module_name, num):
+        pool = context.Pool(num)
+        return (lambda phases=None: pool.map(call_module, [module_name] * num),
+                pool.terminate)
+    return make
+
+def started_with(context):
+    return lambda m, n: (lambda phases=None: processed_with(context, m, n), None)
+
+def sweep_modes():
+    modes = MODES + [("thread_pool", "thread pool (%s threads)", thread_pool)]
+    methods = start_methods()
+    if not methods:
+        modes.append(("process_pool", "process pool (%s procs)", process_pool(multiprocessing)))
+    for method in methods:
+        context = multiprocessing.get_context(method)
+        modes.append(("processed_" + method, "%s (%%s procs)" % method, started_with(context)))
+        modes.append(("process_pool_" + method, "%s pool (%%s procs)" % method,
+                      process_pool(context)))
+    return modes
+
+def show_scaling(module_name, results):
+    # speedup over non_threaded, and the Amdahl and Gustafson fits, for each mode
+    fits = {}
+    times = {}
+    for result in results:
+        times.setdefault(result["mode"], {})[result["workers"]] = result["summary"]["median"]
+    baseline = times["non_threaded"]
+    print("%-23s %7s %10s %10s %10s" % (module_name, "workers", "median", "speedup", "efficiency"))
+    for mode, name, make in sweep_modes():
+        if mode == "non_threaded" or mode not in times:
+            continue
+        scaling = benchrunner.scaling(baseline, times[mode])
+        for result in results:
+            if result["mode"] == mode:
+                result.update(scaling[result["workers"]])
+        for n in sorted(scaling):
+            print("%-23s %7d %10.6f %10.3f %9.0f%%" % (
+                mode, n, times[mode][n], scaling[n]["speedup"], 100 * scaling[n]["efficiency"]))
+        points = [(n, scaling[n]["speedup"]) for n in sorted(scaling)]
+        fits[mode] = {"amdahl": benchrunner.amdahl(points),
+                      "gustafson": benchrunner.gustafson(points)}
+        amdahl, gustafson = fits[mode]["amdahl"], fits[mode]["gustafson"]
+        if amdahl:
+            if amdahl["max_speedup"]:
+                limit = "%.2fx" % amdahl["max_speedup"]
+            else:
+                limit = "unbounded"
+            print("%-23s Amdahl: %.1f%% parallel (speedup limit %s, rms %.3f); "
+                  "Gustafson: %.1f%% parallel (rms %.3f)" % (
+                "", 100 * amdahl["parallel_fraction"], limit, amdahl["rms"],
+                100 * gustafson["parallel_fraction"], gustafson["rms"]))
+    return fits
 
 if __name__ == "__main__":
     import sys
-    from timeit import Timer
+    from optparse import OptionParser
 
-    repeat = 100
-    number = 1
+    parser = OptionParser(usage="%prog [options] module_name ...\n"
+                          "  where module_name contains a function_to_run function")
+    parser.add_option("-r", "--repeat", type="int", default=100,
+                      help="timed runs per test [%default]")
+    parser.add_option("-n", "--number", type="int", default=1,
+                      help="calls per timed run [%default]")
+    parser.add_option("-w", "--warmup", type="int", default=5,
+                      help="untimed runs before each test [%default]")
+    parser.add_option("-c", "--cpus",
+                      help="pin to these CPUs, eg 0,2 or 0-3")
+    parser.add_option("-j", "--json", metavar="FILE",
+                      help="write all samples and their summaries to FILE")
+    parser.add_option("-s", "--sweep", action="store_true",
+                      help="scale the worker count, with pools and start methods")
+    parser.add_option("-m", "--max-workers", type="int",
+                      help="largest worker count for --sweep [twice the CPUs]")
+    parser.add_option("--counts",
+                      help="worker counts to run, eg 1,2,3 [1,2,4,8]")
+    parser.add_option("-p", "--phases", action="store_true",
+                      help="also time the phases of each mode separately")
+    options, args = parser.parse_args()
 
     num_threads = [ 1, 2, 4, 8 ]
 
-    if len(sys.argv) < 2:
-        print 'Usage: %s module_name' % sys.argv[0]
-        print '  where module_name contains a function_to_run function'
+    if len(args) < 1:
+        parser.print_usage()
         sys.exit(1)
-    module_name = sys.argv[1]
-    if module_name.endswith('.py'):
-        module_name = module_name[:-3]
-    print 'Importing %s' % module_name
-    m = __import__(module_name)
-    function_to_run = m.function_to_run
-
-    print 'Starting tests'
-    for i in num_threads:
-        t = Timer("non_threaded(%s)" % i, "from __main__ import non_threaded")
-        best_result = min(t.repeat(repeat=repeat, number=number))
-        show_results("non_threaded (%s iters)" % i, best_result)
-
-        t = Timer("threaded(%s)" % i, "from __main__ import threaded")
-        best_result = min(t.repeat(repeat=repeat, number=number))
-        show_results("threaded (%s threads)" % i, best_result)
-
-        t = Timer("processed(%s)" % i, "from __main__ import processed")
-        best_result = min(t.repeat(repeat=repeat, number=number))
-        show_results("processes (%s procs)" % i, best_result)
-        print "\n",
-
-    print 'Iterations complete'
+    if options.cpus:
+        benchrunner.pin(benchrunner.parse_cpus(options.cpus))
+    modes = MODES
+    if options.sweep:
+        num_threads = sweep_counts(options.max_workers or 2 * available_cpus())
+        modes = sweep_modes()
+    if options.counts:
+        num_threads = benchrunner.parse_cpus(options.counts)
+
+    report = {
+        "modules": [],
+        "host": benchrunner.host(),
+        "settings": {"repeat": options.repeat, "number": options.number,
+                     "warmup": options.warmup, "cpus": options.cpus,
+                     "sweep": bool(options.sweep), "counts": num_threads},
+        "results": [],
+        "fits": {},
+        }
+    for module_name in args:
+        if module_name.endswith('.py'):
+            module_name = module_name[:-3]
+        print('Importing %s' % module_name)
+        m = __import__(module_name)
+        function_to_run = m.function_to_run
+        report["modules"].append(module_name)
+
+        print('Starting tests')
+        show_header()
+        results = []
+        for i in num_threads:
+            for mode, name, make in modes:
+                func, close = make(module_name, i)
+                phases = []
+                try:
+                    samples = benchrunner.measure(func, options.repeat,
+                                                  options.number, options.warmup)
+                    if options.phases:
+                        # separate runs, so recording the phases doesn't add to the samples
+                        for j in range(options.repeat):
+                            func(phases)
+                finally:
+                    if close:
+                        close()
+                summary = benchrunner.summarize(samples)
+                show_results(name % i, summary)
+                result = {"module": module_name, "mode": mode, "workers": i,
+                          "samples": samples, "summary": summary}
+                if phases:
+                    result["phases"] = dict((phase, benchrunner.summarize([p[phase] for p in phases]))
+                                            for phase in phases[0])
+                results.append(result)
+            if options.phases:
+                print("%-27s" % "phases (median)" + "".join(" %10s" % phase for phase in PHASES))
+                for result in results:
+                    if result["workers"] == i and "phases" in result:
+                        show_phases(result["mode"], result["phases"])
+            print()
+        if options.sweep:
+            report["fits"][module_name] = show_scaling(module_name, results)
+            print()
+        report["results"].extend(results)
+
+    if options.json:
+        benchrunner.write_json(options.json, report)
+        print('Wrote %s' % options.json)
+    print('Iterations complete')
@@ -0,0 +1,187 @@
+# Statistics for benchmarking_GIL_effects.py (and anything else timed with timeit)
+#
+# The best of N runs hides how much the runs vary, so this keeps every sample and
+# summarizes the whole distribution: median, p95, p99, standard deviation, and
+# 95% confidence intervals for the mean and the median.
+# A few warm-up runs are made and thrown away first (imports, caches, page faults),
+# and the process can optionally be pinned to a set of CPUs so the scheduler doesn't
+# move it around between runs.
+# Results can be written as JSON, together with a description of the host, so runs
+# on different commits and machines can be compared later.
+# For scaling sweeps, scaling() turns times into speedup and efficiency, and amdahl()
+# and gustafson() fit the two laws to the speedups, to tell how much of a workload
+# runs in parallel.
+
+import math, os, sys, json, platform, subprocess
+from timeit import Timer
+
+# two-sided 95% critical values of Student's t distribution, by degrees of freedom
+T95 = [None, 12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+Z95 = 1.960
+
+def measure(stmt, repeat=100, number=1, warmup=5, setup="pass"):
+    # Time stmt (a string or a callable, as for timeit) repeat times, after warmup runs
+    # that are thrown away.  Each sample is the time for number calls, as with
+    # Timer.repeat.
+    t = Timer(stmt, setup)
+    if warmup:
+        t.repeat(repeat=warmup, number=number)
+    return t.repeat(repeat=repeat, number=number)
+
+def percentile(ordered, p):
+    # p-th percentile of a sorted list, interpolating between the closest ranks
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * p / 100.0
+    f = int(math.floor(k))
+    c = min(f + 1, len(ordered) - 1)
+    return ordered[f] + (ordered[c] - ordered[f]) * (k - f)
+
+def summarize(samples):
+    # Return a dictionary describing the distribution of samples
+    ordered = sorted(samples)
+    n = len(ordered)
+    if not n:
+        raise ValueError("no samples")
+    mean = sum(ordered) / float(n)
+    if n > 1:
+        stddev = math.sqrt(sum((x - mean) ** 2 for x in ordered) / (n - 1))
+    else:
+        stddev = 0.0
+    if 1 < n <= len(T95):
+        t = T95[n - 1]
+    else:
+        t = Z95
+    half = t * stddev / math.sqrt(n)
+    # the median's interval is between the order statistics around it
+    # (normal approximation to the binomial distribution)
+    lo = int(math.floor((n - Z95 * math.sqrt(n)) / 2.0))
+    hi = int(math.ceil((n + Z95 * math.sqrt(n)) / 2.0))
+    q1, q3 = percentile(ordered, 25), percentile(ordered, 75)
+    fence = 1.5 * (q3 - q1)
+    return {
+        "n": n,
+        "min": ordered[0],
+        "max": ordered[-1],
+        "mean": mean,
+        "median": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99),
+        "stddev": stddev,
+        "mean_ci95": [mean - half, mean + half],
+        "median_ci95": [ordered[max(lo, 0)], ordered[min(hi, n - 1)]],
+        # Tukey's fences
+        "outliers": len([x for x in ordered if x < q1 - fence or x > q3 + fence]),
+        }
+
+def pin(cpus):
+    # Restrict this process (and the processes it starts later) to the given CPUs
+    cpus = set(cpus)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+        return
+    try:
+        import psutil
+    except ImportError:
+        raise ValueError("CPU pinning needs os.sched_setaffinity (Python 3 on Linux) or psutil")
+    psutil.Process(os.getpid()).cpu_affinity(sorted(cpus))
+
+def parse_cpus(text):
+    # "0,2-3" -> [0, 2, 3]
+    cpus = []
+    for part in text.split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.append(int(part))
+    return cpus
+
+def affinity():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return None
+
+def cpu_count():
+    try:
+        import multiprocessing
+        return multiprocessing.cpu_count()
+    except (ImportError, NotImplementedError):
+        return None
+
+def commit():
+    # the git commit of the benchmark code, if it's in a git checkout
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        p = subprocess.Popen(["git", "rev-parse", "HEAD"], cwd=here,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out = p.communicate()[0]
+    except OSError:
+        return None
+    if p.returncode:
+        return None
+    return out.decode("ascii").strip()
+
+def host():
+    # what the numbers were measured on
+    return {
+        "node": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "executable": sys.executable,
+        "cpu_count": cpu_count(),
+        "affinity": affinity(),
+        "commit": commit(),
+        }
+
+def write_json(filename, data):
+    f = open(filename, "w")
+    try:
+        json.dump(data, f, indent=1, sort_keys=True)
+        f.write("\n")
+    finally:
+        f.close()
+
+def scaling(baseline, times):
+    # speedup and parallel efficiency for each worker count, given
+    # {workers: seconds} for the serial baseline and for a parallel mode
+    # doing the same work
+    result = {}
+    for n in sorted(times):
+        if n in baseline and times[n] > 0:
+            speedup = baseline[n] / times[n]
+            result[n] = {"speedup": speedup, "efficiency": speedup / n}
+    return result
+
+def _rms(points, model):
+    return math.sqrt(sum((s - model(n)) ** 2 for n, s in points) / len(points))
+
+def amdahl(points):
+    # Fit Amdahl's law, S(n) = 1 / ((1 - p) + p / n), to (workers, speedup) points.
+    # 1 - 1/S = p (1 - 1/n) is linear in p, so this is a least squares fit of that.
+    xy = [(1 - 1.0 / n, 1 - 1.0 / s) for n, s in points if n > 1 and s > 0]
+    if not xy:
+        return None
+    p = sum(x * y for x, y in xy) / sum(x * x for x, y in xy)
+    p = min(max(p, 0.0), 1.0)
+    if p < 1:
+        limit = 1 / (1 - p)
+    else:
+        limit = None # no serial part, no limit
+    return {"parallel_fraction": p, "max_speedup": limit,
+            "rms": _rms(points, lambda n: 1 / ((1 - p) + p / n))}
+
+def gustafson(points):
+    # Fit Gustafson's law, S(n) = (1 - a) + a n, to (workers, speedup) points
+    # (least squares for a, with S(1) = 1)
+    xy = [(n - 1, s - 1) for n, s in points if n > 1]
+    if not xy:
+        return None
+    a = sum(x * y for x, y in xy) / float(sum(x * x for x, y in xy))
+    return {"parallel_fraction": a,
+            "rms": _rms(points, lambda n: (1 - a) + a * n)}
@@ -39,46 +39,50 @@ I'll do the quick search for the leading part of the pattern to search for, then
 '''
 
 # dalke-wf-10.py  fast string ops, mmap, post-process filter
+from __future__ import print_function
+
 import re, os, mmap
 from collections import defaultdict
 
 FILE = "o1000k.ap"
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 search = pat.search
 
 
 def count_file(filename):
     count = defaultdict(int)
-    fileobj = open(FILE)
+    fileobj = open(FILE, "rb")
     filemap = mmap.mmap(fileobj.fileno(), os.path.getsize(FILE), access=mmap.ACCESS_READ)
     i = j = 0
     # For the first pass, including everything which is a reasonable match.
     # It's faster to count everything and filter later than it is to do
     # the filtering now.
     while 1:
-        i = filemap.find("GET /ongoing/When/", j)
+        i = filemap.find(b"GET /ongoing/When/", j)
         if i == -1:
             break
-        j = filemap.find(' ', i+19)
+        j = filemap.find(b' ', i+19)
         field = filemap[i:j]
         count[field] += 1
 
     # The previous code included fields which aren't allowed by the
     # regular expression.  Filter those which don't match the regexp.
     new_count = {}
-    for k, v in count.iteritems():
+    for k, v in count.items():
         # because of the way the key was saved, I didn't keep the
         # trailing space.  Add it back here so the regexp can be used unchanged.
-        k = k + " "
+        k = k + b" "
         m = pat.search(k)
         if m:
             new_count[m.group(1)] = v
@@ -88,13 +92,13 @@ def count_file(filename):
 count = count_file(FILE)
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # sanity check
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
 '''
 Variable lookups in module scope are slower than lookups in local scope so I introduced the count_file function to get a bit more speed.
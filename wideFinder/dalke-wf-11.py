@@ -10,20 +10,24 @@ Though I don't know what chunks would be faster than mmap here.
 If you're interested, here it is:
 '''
 
+from __future__ import print_function
+
 import re
 from collections import defaultdict
 
 FILE = "o1000k.ap"
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
 # Choosing the right chunk size affect the timings.  Here
 # are performance numbers for my machine.
@@ -40,7 +44,7 @@ CHUNKSIZE = 14*1024
 
 def count_file(filename):
     count = defaultdict(int)
-    infile = file(filename)
+    infile = open(filename, "rb")
 
     # For the first pass, including everything which is a reasonable match.
     # It's faster to count everything and filter later than it is to do
@@ -52,20 +56,20 @@ def count_file(filename):
             break
         i = j = 0
         while 1:
-            i = text.find('GET /ongoing/When/', j)
+            i = text.find(b'GET /ongoing/When/', j)
             if i == -1:
                 break
-            j = text.find(' ', i+19)
+            j = text.find(b' ', i+19)
             field = text[i:j]
             count[field] += 1
 
     # The previous code included fields which aren't allowed by the
     # regular expression.
     new_count = {}
-    for k, v in count.iteritems():
+    for k, v in count.items():
         # because of the way the key was saved, I didn't keep the
         # trailing space.  Add it back here so the regexp can be used unchanged.
-        k = k + " "
+        k = k + b" "
         m = pat.search(k)
         if m:
             new_count[m.group(1)] = v
@@ -74,13 +78,13 @@ def count_file(filename):
 count = count_file(FILE)
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # sanity check
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
 '''
 It's all a bad idea
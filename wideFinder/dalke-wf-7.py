@@ -6,22 +6,26 @@ mmap and re playing together using the buffer interface
 Python has a concept called a buffer interface. Strings and a few other data types, including memory-mapped files, implement the buffer interface.
 String operations (like 'find') and regular expressions can work on buffer objects. Which means I am able to apply the regular expression directly to a memory-mapped file.
 '''
+from __future__ import print_function
+
 import re, os, mmap
 from collections import defaultdict
 
 FILE = "o1000k.ap"
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
-fileobj = open(FILE)
+fileobj = open(FILE, "rb")
 filemap = mmap.mmap(fileobj.fileno(), os.path.getsize(FILE), access=mmap.ACCESS_READ)
 
 count = defaultdict(int)
@@ -29,13 +33,13 @@ for m in pat.findall(filemap):
     count[m] +=1
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # sanity check
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
 '''
 In my original code I used finditer instead of findall to find all the matches.
@@ -1,10 +1,26 @@
-import urllib, os
+# generates the o1000k.ap sample file used by the scripts: 200 megabytes
+# of synthetic log lines with realistic skew (see wflib/generate.py),
+# made offline, on all cores.  "python getdata.py repeat" makes it the
+# old way instead, by repeating o10k.ap a hundred times (and downloads
+# o10k.ap first, if it's missing).
 
-if not os.path.isfile("o10k.ap"):
-    urllib.urlretrieve("http://www.tbray.org/tmp/o10k.ap", "o10k.ap")
+import os, sys
 
-if not os.path.isfile("o1000k.ap"):
-    data = open("o10k.ap").read()
-    file = open("o1000k.ap", "w")
-    file.writelines(data for i in range(100))
-    file.close()
+if "repeat" in sys.argv[1:]:
+    if not os.path.isfile("o10k.ap"):
+        try:
+            from urllib import urlretrieve
+        except ImportError:
+            from urllib.request import urlretrieve # python 3
+        urlretrieve("http://www.tbray.org/tmp/o10k.ap", "o10k.ap")
+
+    if not os.path.isfile("o1000k.ap"):
+        data = open("o10k.ap", "rb").read()
+        file = open("o1000k.ap", "wb")
+        file.writelines(data for i in range(100))
+        file.close()
+
+elif not os.path.isfile("o1000k.ap"):
+    from multiprocessing import cpu_count
+    from wflib.generate import generate
+    generate("o1000k.ap", 200*1024*1024, cpu_count())
@@ -0,0 +1,323 @@
+# cross-checks wflib against plain re.findall over the whole file
+#
+#     python test-wflib.py [logfile]
+#
+# runs every backend, with every chunk size mode, io strategy, transport,
+# pool kind, start method and reduce mode, and the index, approximate,
+# several-pattern, several-file, follow and column options, on the log
+# (o10k.ap by default) and on a copy of it with CRLF line ends and stray
+# carriage returns.  every count must be the same as counting the
+# matches of re.findall over the whole file (approximate counts must be
+# within their error bounds).  prints one line per check that fails,
+# and exits with status 1 if any did.
+#
+# the patterns can't match across a newline, so chunking mustn't change
+# the counts.  two of them get the "lines" plan in literal.py, which
+# splits chunks into lines, so they check that CRLF files are split on
+# newlines only.
+
+from __future__ import print_function
+
+import os, sys, gzip, shutil, tempfile, traceback
+from collections import defaultdict
+
+import wflib
+from wflib.compat import compile
+from wflib.engines import BACKENDS
+
+QUERY = r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .\n]+) "
+
+PATTERNS = [
+    QUERY,
+    r"HTTP/1\.[01]\" (\d+)[^\n]", # status, and what's after it
+    r"(GET) /ongoing/When/\d\d\dx/(\d\d\d\d)/", # more than one group
+    r"0700\]([^\n]) \"GET", # "lines" plan
+    r"([^\n ]+) HTTP/1.1\"[^\n]", # "lines" plan
+    r"(\r)",
+    r"(NO MATCH IN HERE)",
+    ]
+
+CHUNKSIZES = (None, 16*1024, "auto", "guided")
+IOS = (None, "sequential", "willneed", "pread")
+MAP_IOS = (None, "sequential", "willneed")
+
+failures = []
+checks = [0]
+
+def reference(data, pattern):
+    # count the matches of plain findall over the whole text
+    count = defaultdict(int)
+    for key in compile(pattern).findall(data):
+        count[key] += 1
+    return dict(count)
+
+def check(name, expected, run):
+    checks[0] += 1
+    try:
+        got = dict(run())
+    except Exception:
+        failures.append(name)
+        print("FAIL %s: %s" % (name, traceback.format_exc().splitlines()[-1]))
+        return
+    if got != expected:
+        failures.append(name)
+        missing = [key for key in expected if got.get(key) != expected[key]]
+        print("FAIL %s: %d keys, expected %d; %d differ, e.g. %r" % (
+            name, len(got), len(expected), len(missing), missing[:1]
+            ))
+
+def backends():
+    names = sorted(BACKENDS)
+    try:
+        import numpy
+    except ImportError:
+        names.remove("numpy")
+    return names
+
+def ios(backend):
+    # the io strategies a backend takes (the others must be rejected)
+    if backend in ("serial", "threads", "processes"):
+        return IOS
+    if backend in ("mmap", "numpy"):
+        return MAP_IOS
+    return (None,)
+
+def rejected(file, pattern, backend, io):
+    try:
+        wflib.count_file(file, pattern, backend, 2, 16*1024, io=io)
+    except ValueError:
+        return {}
+    raise AssertionError("io=%r accepted" % io)
+
+def approximate(file, pattern, expected, backend, k=50):
+    # every count in the summary must be within its error bound
+    summary = wflib.count_file(file, pattern, backend, 2, 16*1024,
+                               approximate=k)
+    if len(summary.counts) > k:
+        raise AssertionError("%d keys in the summary" % len(summary.counts))
+    for key, value in summary.counts.items():
+        if not value - summary.errors[key] <= expected.get(key, 0) <= value:
+            raise AssertionError("%r = %d (-%d), expected %d" % (
+                key, value, summary.errors[key], expected.get(key, 0)))
+    return expected
+
+def follow(file, pattern):
+    follower = wflib.Follower(file, pattern)
+    follower.update()
+    return follower.count
+
+def index(file, pattern):
+    # the second run comes from the index; change a byte in the middle,
+    # and the third run has to notice
+    path = file + ".idx"
+    shutil.copy(file, path)
+    first = wflib.count_file(path, pattern, "mmap", 2, 16*1024, index=True)
+    second = wflib.count_file(path, pattern, "mmap", 2, 16*1024, index=True)
+    if first != second:
+        raise AssertionError("index run differs")
+    f = open(path, "r+b")
+    try:
+        f.seek(os.path.getsize(path) // 2)
+        f.write(b"X")
+    finally:
+        f.close()
+    third = wflib.count_file(path, pattern, "mmap", 2, 16*1024, index=True)
+    f = open(path, "rb")
+    try:
+        if third != reference(f.read(), pattern):
+            raise AssertionError("index missed a change")
+    finally:
+        f.close()
+        os.remove(path)
+        os.remove(path + ".wfi")
+    return first
+
+def grow(file, pattern, backend):
+    # append to an indexed log: only the old last chunk and the new ones
+    # are processed again, with the backend's default chunk size
+    path = file + ".grow"
+    shutil.copy(file, path)
+    try:
+        first = wflib.count_file(path, pattern, backend, 2, index=True)
+        f = open(file, "rb")
+        tail = f.read(64*1024)
+        f.close()
+        tail = tail[:tail.rfind(b"\n") + 1]
+        f = open(path, "ab")
+        f.write(tail)
+        f.close()
+        stats = wflib.Stats()
+        count = wflib.count_file(path, pattern, backend, 2, index=True,
+                                 stats=stats)
+        jobs = sum(stats.jobs.values())
+        if jobs > 2:
+            raise AssertionError("%d chunks processed again" % jobs)
+        f = open(path, "rb")
+        try:
+            if count != reference(f.read(), pattern):
+                raise AssertionError("wrong count after append")
+        finally:
+            f.close()
+    finally:
+        os.remove(path)
+        os.remove(path + ".wfi")
+    return first
+
+def shardsfail(file, pattern, pool):
+    # a shards batch that fails part way must not leave totals behind in
+    # the workers of a persistent pool
+    from wflib import engines
+    getchunks = engines.getchunks
+    def failing(file, size=None, start=0):
+        chunks = getchunks(file, 16*1024, start)
+        for i in range(3):
+            yield next(chunks)
+        raise IOError("no more chunks")
+    engines.getchunks = failing
+    try:
+        pool.count_file(file, pattern, "processes", 16*1024, reduce="shards")
+        raise AssertionError("the batch didn't fail")
+    except RuntimeError:
+        pass
+    finally:
+        engines.getchunks = getchunks
+    if pool.batches():
+        raise AssertionError("totals left behind: %r" % pool.batches())
+    return pool.count_file(file, pattern, "processes", 16*1024,
+                           reduce="shards")
+
+def checkfile(file, data, label, pools):
+    print("%s: %d bytes" % (label, len(data)))
+    for pattern in PATTERNS:
+        expected = reference(data, pattern)
+        for backend in backends():
+            for chunksize in CHUNKSIZES:
+                check("%s %r %s chunksize=%s" % (label, pattern, backend,
+                                                  chunksize),
+                      expected, lambda: wflib.count_file(
+                          file, pattern, backend, 2, chunksize))
+            for io in ios(backend)[1:]:
+                check("%s %r %s io=%s" % (label, pattern, backend, io),
+                      expected, lambda: wflib.count_file(
+                          file, pattern, backend, 2, 16*1024, io=io))
+            for io in IOS[1:]:
+                if io not in ios(backend):
+                    check("%s %r %s rejects io=%s" % (label, pattern,
+                                                      backend, io),
+                          {}, lambda: rejected(file, pattern, backend, io))
+            check("%s %r %s approximate" % (label, pattern, backend),
+                  expected, lambda: approximate(file, pattern, expected,
+                                                backend))
+        for name, pool in pools:
+            for backend in backends():
+                check("%s %r %s on %s" % (label, pattern, backend, name),
+                      expected, lambda: pool.count_file(
+                          file, pattern, backend, 16*1024))
+        for start in ("exec", "fork"):
+            if start == "fork" and not hasattr(os, "fork"):
+                continue
+            check("%s %r start=%s" % (label, pattern, start), expected,
+                  lambda: wflib.count_file(file, pattern, "processes", 2,
+                                           16*1024, start=start))
+        check("%s %r reduce=shards" % (label, pattern), expected,
+              lambda: wflib.count_file(file, pattern, "processes", 2,
+                                       16*1024, reduce="shards"))
+        for name, pool in pools:
+            check("%s %r failed reduce=shards on %s" % (label, pattern, name),
+                  expected, lambda: shardsfail(file, pattern, pool))
+        check("%s %r index" % (label, pattern), expected,
+              lambda: index(file, pattern))
+        for backend in ("serial", "mmap"):
+            check("%s %r index append %s" % (label, pattern, backend),
+                  expected, lambda: grow(file, pattern, backend))
+        check("%s %r follow" % (label, pattern), expected,
+              lambda: follow(file, pattern))
+
+    # several patterns in one pass
+    named = dict(("p%d" % i, pattern) for i, pattern in enumerate(PATTERNS))
+    for backend in backends():
+        checks[0] += 1
+        try:
+            many = wflib.count_many(file, named, backend, 2, 16*1024)
+        except Exception:
+            failures.append("%s count_many %s" % (label, backend))
+            print("FAIL %s count_many %s: %s" % (
+                label, backend, traceback.format_exc().splitlines()[-1]))
+            continue
+        for name, pattern in sorted(named.items()):
+            check("%s count_many %s %r" % (label, backend, pattern),
+                  reference(data, pattern),
+                  lambda: many[name])
+
+    # columns.  lines that aren't in the combined format (like the ones
+    # with a carriage return after the timestamp) are skipped
+    status = dict((int(key), value) for key, value in reference(
+        data, r"\] \"[^\"\n]*\" (\d{3}) (?:\d+|-) \"").items())
+    for workers in (1, 2):
+        check("%s columns status workers=%d" % (label, workers), status,
+              lambda: wflib.parse(file, workers).count("status"))
+
+def checkfiles(dir, data, label):
+    # the same text plain, as a single gzip stream, and as two gzip
+    # members.  together, the stream is one job for a worker; on its
+    # own, it's decompressed here and handed out in blocks.
+    half = data.rfind(b"\n", 0, len(data) // 2) + 1
+    files = os.path.join(dir, "files")
+    os.mkdir(files)
+    open(os.path.join(files, "log"), "wb").write(data)
+    z = gzip.open(os.path.join(files, "stream.gz"), "wb")
+    z.write(data)
+    z.close()
+    for name, part in (("first.gz", data[:half]), ("second.gz", data[half:])):
+        z = gzip.open(os.path.join(dir, name), "wb")
+        z.write(part)
+        z.close()
+    f = open(os.path.join(files, "members.gz"), "wb")
+    for name in ("first.gz", "second.gz"):
+        f.write(open(os.path.join(dir, name), "rb").read())
+    f.close()
+    for pattern in PATTERNS:
+        expected = dict((key, 3 * value) for key, value in
+                        reference(data, pattern).items())
+        for backend in ("serial", "threads", "processes", "mmap"):
+            check("%s count_files %s %r" % (label, backend, pattern),
+                  expected, lambda: wflib.count_files(
+                      files, pattern, backend, 2, 16*1024))
+            check("%s count_files %s %r stream" % (label, backend, pattern),
+                  reference(data, pattern), lambda: wflib.count_files(
+                      os.path.join(files, "stream.gz"), pattern, backend, 2,
+                      16*1024))
+    shutil.rmtree(files)
+
+def main(argv):
+    source = "o10k.ap"
+    if len(argv) > 1:
+        source = argv[1]
+    data = open(source, "rb").read()
+    if "numpy" not in backends():
+        print("numpy isn't installed; skipping the numpy backend")
+    # CRLF line ends, and some carriage returns in the middle of lines
+    crlf = data.replace(b"\n", b"\r\n").replace(b"-0700]", b"-0700]\r", 50)
+    dir = tempfile.mkdtemp(prefix="wflib-test-")
+    pools = [
+        ("marshal pool", wflib.Pool(2)),
+        ("shm pool", wflib.Pool(2, "shm")),
+        ("event pool", wflib.EventPool(2, depth=2)),
+        ("shm event pool", wflib.EventPool(2, "shm")),
+        ]
+    try:
+        for label, text in (("lf", data), ("crlf", crlf)):
+            file = os.path.join(dir, label + ".ap")
+            open(file, "wb").write(text)
+            checkfile(file, text, label, pools)
+            checkfiles(dir, text, label)
+    finally:
+        for name, pool in pools:
+            pool.close()
+        shutil.rmtree(dir)
+    print("%d checks, %d failed" % (checks[0], len(failures)))
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv)
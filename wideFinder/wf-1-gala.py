@@ -1,18 +1,22 @@
 # http://memojo.com/~sgala/blog/2007/09/29/Python-Erlang-Map-Reduce
 
+from __future__ import print_function
+
 import re
 from collections import defaultdict
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-matches = (re.search(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ",line)
-                   for line in file("o1000k.ap"))
+matches = (re.search(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ",line)
+                   for line in open("o1000k.ap", "rb"))
 mapp    = (match.groups()[0] for match in matches if match)
 
 count=defaultdict(int)
@@ -20,9 +24,9 @@ for page in mapp:
     count[page] +=1
 
 for key in sorted(count.keys(), key=count.get)[-10:]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 for key in sorted(count.keys(), key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
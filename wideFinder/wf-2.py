@@ -2,25 +2,29 @@
 # implementation.  see:
 # http://memojo.com/~sgala/blog/2007/09/29/Python-Erlang-Map-Reduce
 
+from __future__ import print_function
+
 import re
 from collections import defaultdict
 
 FILE = "o1000k.ap"
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
 search = pat.search
 
 # map
-matches = (search(line) for line in open(FILE, "rb") if "GET /ongoing/When" in line)
+matches = (search(line) for line in open(FILE, "rb") if b"GET /ongoing/When" in line)
 mapp    = (match.group(1) for match in matches if match)
 
 # reduce
@@ -29,10 +33,10 @@ for page in mapp:
     count[page] +=1
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # sanity check
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
@@ -1,5 +1,7 @@
 # chunked access
 
+from __future__ import print_function
+
 import re
 from collections import defaultdict
 
@@ -26,7 +28,7 @@ if 0:
         d = defaultdict(int)
         search = pat.search
         for line in f.read(chunk[1]).splitlines():
-            if "GET /ongoing/When" in line:
+            if b"GET /ongoing/When" in line:
                 m = search(line)
                 if m:
                     d[m.group(1)] += 1
@@ -48,14 +50,16 @@ else:
 # main program
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
 count = defaultdict(int)
 
@@ -64,11 +68,11 @@ for chunk in getchunks(FILE):
         count[key] += value
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # --------------------------------------------------------------------
 
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
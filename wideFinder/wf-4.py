@@ -1,9 +1,15 @@
 # chunked access from multiple threads.  on my machine, the optimal number
 # of threads appears to be 2 * number of CPU:s.
 
+from __future__ import print_function
+
 import re, sys
 from collections import defaultdict
-import threading, Queue
+import threading
+try:
+    import Queue
+except ImportError:
+    import queue as Queue # python 3
 
 # 1: 2.7 seconds
 # 2: 2.5 seconds
@@ -43,14 +49,16 @@ class Worker(threading.Thread):
 # --------------------------------------------------------------------
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
 FILE = "o1000k.ap"
 
@@ -78,11 +86,11 @@ for item in result:
         count[key] += value
 
 for key in sorted(count, key=count.get)[:10]:
-    pass # print "%40s = %s" % (key, count[key])
+    pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-print timer() - t0, time.clock() - t1
+print(timer() - t0, clock() - t1)
 
 # --------------------------------------------------------------------
 
 for key in sorted(count, key=count.get)[-10:]:
-    print "%40s = %s" % (key, count[key])
+    print("%40s = %s" % (key.decode("latin-1"), count[key]))
@@ -1,10 +1,16 @@
 # a multi-process, memory-mapped implementation.  lots of code here;
 # this one could definitely benefit from a support library...
 
+from __future__ import print_function
+
 import re, sys, os
 from collections import defaultdict
 
-import threading, Queue, subprocess
+import threading, subprocess
+try:
+    import Queue
+except ImportError:
+    import queue as Queue # python 3
 import marshal, struct
 
 # configuration
@@ -69,7 +75,7 @@ class Worker(threading.Thread):
         while 1:
             cmd = queue.get()
             if cmd is None:
-                stdin.write("0\n")
+                stdin.write(b"0\n")
                 break
             putobject(stdin, cmd)
             result.append(getobject(stdout))
@@ -78,27 +84,30 @@ class Worker(threading.Thread):
 # --------------------------------------------------------------------
 
 import time, sys
-if sys.platform == "win32":
-    timer = time.clock
+if sys.version_info[0] >= 3:
+    timer, clock = time.perf_counter, time.process_time
+elif sys.platform == "win32":
+    timer = clock = time.clock
 else:
-    timer = time.time
+    timer, clock = time.time, time.clock
 
-t0, t1 = timer(), time.clock()
+t0, t1 = timer(), clock()
 
-pat = re.compile(r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
+pat = re.compile(br"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ")
 
 FILE = "o1000k.ap"
 
 if "--process" in sys.argv:
 
-    stdin = sys.stdin
-    stdout = sys.stdout
+    # the pipes carry bytes (sys.stdin is text on python 3)
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    stdout = getattr(sys.stdout, "buffer", sys.stdout)
     while 1:
         args = getobject(stdin)
         if args is None:
             sys.exit(0) # terminate
         result = process(*args)
-        putobject(stdout, result)
+        putobject(stdout, dict(result)) # marshal wants a plain dict
 
 else:
 
@@ -111,7 +120,7 @@ else:
         w.setDaemon(1)
         w.start()
 
-    chunksize = max(1, os.path.getsize(FILE) / CPUS / (1024*1024))
+    chunksize = max(1, os.path.getsize(FILE) // CPUS // (1024*1024))
 
     # distribute the chunks
     for chunk in getchunks(FILE, chunksize*1024*1024):
@@ -128,11 +137,11 @@ else:
 
     # process result
     for key in sorted(count, key=count.get)[:10]:
-        pass # print "%40s = %s" % (key, count[key])
+        pass # print("%40s = %s" % (key.decode("latin-1"), count[key]))
 
-    print timer() - t0, time.clock() - t1
+    print(timer() - t0, clock() - t1)
 
 # --------------------------------------------------------------------
 
     for key in sorted(count, key=count.get)[-10:]:
-        print "%40s = %s" % (key, count[key])
+        print("%40s = %s" % (key.decode("latin-1"), count[key]))
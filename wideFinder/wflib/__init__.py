@@ -0,0 +1,22 @@
+# wflib -- a support library for the wide finder scripts.
+#
+# the chunking, worker and merge code from wf-3.py ... wf-6.py and the
+# dalke-wf-* scripts, collected in one place.  usage:
+#
+#     import wflib
+#     for key, value in wflib.find("o1000k.ap", pattern, backend="mmap"):
+#         print "%40s = %s" % (key, value)
+#
+# see engines.py for the available backends.
+
+from wflib.chunks import getchunks
+from wflib.columns import parse
+from wflib.engines import BACKENDS, find, count_file, merge, top
+from wflib.engines import find_many, count_many, find_files, count_files
+from wflib.events import EventPool
+from wflib.follow import Follower
+from wflib.index import Index
+from wflib.multi import Patterns
+from wflib.pool import Pool
+from wflib.stats import Stats
+from wflib.topk import SpaceSaving
@@ -0,0 +1,61 @@
+# command line interface:
+#
+#     python -m wflib [backend [workers [file [chunksize [start]]]]]
+#
+# runs the standard wide finder query, and prints the time taken, how
+# busy each worker was, and the top ten pages in the same format as the
+# wf-*.py scripts.  chunksize is a number of bytes, "auto", "guided" or
+# "none".  file can also be a directory or a glob pattern (see
+# files.py).  start is "exec" or "fork", for how the worker processes
+# are started (see prefork.py).
+
+from __future__ import print_function
+
+import os, sys
+
+import wflib
+from wflib.stats import timer, cputime
+
+pat = r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) "
+
+def main(argv):
+    backend = "mmap"
+    workers = 2
+    FILE = "o1000k.ap"
+    if len(argv) > 1:
+        backend = argv[1]
+    if len(argv) > 2:
+        workers = int(argv[2])
+    if len(argv) > 3:
+        FILE = argv[3]
+    chunksize = None
+    if len(argv) > 4:
+        chunksize = argv[4]
+        if chunksize.isdigit():
+            chunksize = int(chunksize)
+        elif chunksize == "none":
+            chunksize = None
+    options = {}
+    if len(argv) > 5:
+        options["start"] = argv[5]
+
+    t0, t1 = timer(), cputime()
+
+    stats = wflib.Stats()
+    if os.path.isfile(FILE):
+        result = wflib.find(FILE, pat, backend, workers, chunksize,
+                            stats=stats, **options)
+    else:
+        result = wflib.find_files(FILE, pat, backend, workers, chunksize,
+                                  stats=stats, **options)
+
+    print(timer() - t0, cputime() - t1)
+
+    for line in stats.report():
+        print(line)
+
+    for key, value in reversed(result):
+        print("%40s = %s" % (key, value))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,169 @@
+# I/O hints, for the disk-bound case.  test-walkthrough.py times the
+# scripts with the log in the page cache; on a cold cache, how the file
+# is read matters more than how it is searched.  the readers in
+# process.py take an io strategy:
+#
+#     None          plain reads and maps
+#     "sequential"  tell the kernel the chunk is read front to back, so
+#                   it reads further ahead (POSIX_FADV_SEQUENTIAL, or
+#                   MADV_SEQUENTIAL for maps)
+#     "willneed"    ask for the whole chunk to be read in right away
+#                   (POSIX_FADV_WILLNEED / MADV_WILLNEED)
+#     "pread"       read the chunk with large unbuffered reads (not
+#                   for maps, which aren't read; see MAP_STRATEGIES)
+#
+# drop(file) evicts a file from the page cache (POSIX_FADV_DONTNEED),
+# and resident(file) tells how much of it is cached, for cold-cache
+# benchmarks (see bench.py).  the hints go through ctypes (or
+# mmap.madvise, on python 3.8 and later), and quietly do nothing where
+# they aren't available.
+
+import os, mmap, ctypes, ctypes.util
+
+from wflib.compat import PY3
+
+STRATEGIES = (None, "sequential", "willneed", "pread")
+MAP_STRATEGIES = (None, "sequential", "willneed") # for hintmap
+
+PREAD = 8*1024*1024 # read size for the "pread" strategy
+
+# same values for the fadvise and madvise versions, on linux
+NORMAL, RANDOM, SEQUENTIAL, WILLNEED, DONTNEED = range(5)
+
+PROT_READ = MAP_SHARED = 1
+MAP_FAILED = ctypes.c_void_p(-1).value
+
+ADVICE = {"sequential": SEQUENTIAL, "willneed": WILLNEED}
+
+libc = None
+if os.name == "posix":
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.posix_fadvise.argtypes = [
+            ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_int
+            ]
+        libc.madvise.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int
+            ]
+        libc.mincore.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p
+            ]
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+            ctypes.c_int, ctypes.c_int64
+            ]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    except (OSError, AttributeError):
+        libc = None
+
+def fadvise(fd, offset, length, advice):
+    # returns true if the advice was taken
+    if libc is None:
+        return False
+    return libc.posix_fadvise(fd, offset, length, advice) == 0
+
+def address(map):
+    # return the address of a memory map, or None.  python 3 has no
+    # PyObject_AsReadBuffer, and ctypes won't take a read-only map.
+    if PY3:
+        return None
+    pointer = ctypes.c_void_p()
+    size = ctypes.c_ssize_t()
+    ctypes.pythonapi.PyObject_AsReadBuffer(
+        ctypes.py_object(map), ctypes.byref(pointer), ctypes.byref(size)
+        )
+    return pointer.value
+
+def madvise(map, offset, length, advice):
+    # advise on part of a memory map.  returns true if the advice was
+    # taken.
+    if not length:
+        return False
+    start = offset - offset % mmap.PAGESIZE
+    if hasattr(map, "madvise"):
+        try:
+            map.madvise(advice, start, length + offset - start)
+        except (OSError, ValueError):
+            return False
+        return True
+    base = address(map)
+    if libc is None or base is None:
+        return False
+    return libc.madvise(base + start, length + offset - start, advice) == 0
+
+def hint(fd, chunk, io):
+    # give the hint for an io strategy for a chunk of an open file
+    if io in ADVICE:
+        fadvise(fd, chunk[0], chunk[1], ADVICE[io])
+    elif io not in STRATEGIES:
+        raise ValueError("unknown io strategy: %r" % io)
+
+def hintmap(map, offset, size, io):
+    # give the hint for an io strategy for part of a memory map
+    if io in ADVICE:
+        madvise(map, offset, size, ADVICE[io])
+    elif io not in MAP_STRATEGIES:
+        raise ValueError("unknown io strategy for a map: %r" % io)
+
+def readchunk(file, chunk, io=None):
+    # read a chunk of a file using an io strategy
+    start, size = chunk
+    if io != "pread":
+        f = open(file, "rb")
+        try:
+            hint(f.fileno(), chunk, io)
+            f.seek(start)
+            return f.read(size)
+        finally:
+            f.close()
+    fd = os.open(file, os.O_RDONLY)
+    try:
+        os.lseek(fd, start, 0)
+        pieces = []
+        while size > 0:
+            data = os.read(fd, min(size, PREAD))
+            if not data:
+                break
+            pieces.append(data)
+            size -= len(data)
+        return b"".join(pieces)
+    finally:
+        os.close(fd)
+
+def drop(file):
+    # evict a file from the page cache.  only clean pages can be
+    # dropped, so the file is synced first.  returns true if the kernel
+    # took the advice.
+    fd = os.open(file, os.O_RDONLY)
+    try:
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        return fadvise(fd, 0, 0, DONTNEED)
+    finally:
+        os.close(fd)
+
+def resident(file):
+    # return the fraction of a file that is in the page cache, or None
+    # if it can't be found out
+    size = os.path.getsize(file)
+    if libc is None or not size:
+        return None
+    # mapped with libc, since mincore needs the address
+    fd = os.open(file, os.O_RDONLY)
+    try:
+        base = libc.mmap(None, size, PROT_READ, MAP_SHARED, fd, 0)
+    finally:
+        os.close(fd)
+    if base is None or base == MAP_FAILED:
+        return None
+    try:
+        pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+        vec = ctypes.create_string_buffer(pages)
+        if libc.mincore(base, size, vec) != 0:
+            return None
+        return float(sum(c & 1 for c in bytearray(vec.raw))) / pages
+    finally:
+        libc.munmap(base, size)
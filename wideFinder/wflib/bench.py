@@ -0,0 +1,198 @@
+# benchmarks for the wflib internals.
+#
+#     python -m wflib.bench transport|reduce|numpy|io|start [file [workers]]
+#
+# "transport" compares the marshal and shared memory result transports,
+# and "reduce" compares merging in the parent with sharded merging in the
+# workers.  both use a query with lots of unique keys and small chunks,
+# so that passing the results around and merging them is a large part
+# of the work.  "numpy" compares the numpy backend with dalke-wf-10.py
+# on the standard query.  "io" runs the standard query with each io
+# strategy (see advise.py), with the file dropped from the page cache
+# before each run, and reports the throughput.  "start" compares new
+# interpreters with forked worker processes (see prefork.py): how long
+# the workers take to start, and how long a pool takes to make and run
+# the standard query once.
+
+from __future__ import print_function
+
+import os, sys, mmap
+from collections import defaultdict
+
+from wflib.advise import STRATEGIES, MAP_STRATEGIES, drop, resident
+from wflib.compat import compile
+from wflib.engines import count_file
+from wflib.pool import Pool
+from wflib.stats import timer
+
+PATTERN = r"\[([^]]+\] \"\w+ \S+)" # timestamp and path
+
+QUERY = r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) "
+
+def show_results(name, result):
+    print("%-23s %4.6f seconds" % (name, result))
+
+def compare(file, variants, workers=2, repeat=5, chunksize=64*1024):
+    # variants is a list of (name, pool options, count_file options)
+    count = None
+    for name, pooloptions, options in variants:
+        pool = Pool(workers, **pooloptions)
+        try:
+            best = None
+            for i in range(repeat):
+                t0 = timer()
+                result = pool.count_file(file, PATTERN, "processes",
+                                         chunksize, **options)
+                t = timer() - t0
+                if best is None or t < best:
+                    best = t
+        finally:
+            pool.close()
+        if count is None:
+            count = result
+        elif result != count:
+            raise AssertionError("%s gave different counts" % name)
+        show_results("%s (%d keys)" % (name, len(result)), best)
+
+def transport(file, workers=2):
+    compare(file, [
+        ("marshal", {"transport": "marshal"}, {}),
+        ("shm", {"transport": "shm"}, {}),
+        ], workers)
+
+def reduce(file, workers=2):
+    compare(file, [
+        ("parent", {}, {"reduce": "parent"}),
+        ("shards", {}, {"reduce": "shards"}),
+        ], workers)
+
+def dalke10(file):
+    # count_file from dalke-wf-10.py
+    pat = compile(QUERY)
+    count = defaultdict(int)
+    fileobj = open(file)
+    filemap = mmap.mmap(fileobj.fileno(), os.path.getsize(file),
+                        access=mmap.ACCESS_READ)
+    i = j = 0
+    while 1:
+        i = filemap.find(b"GET /ongoing/When/", j)
+        if i == -1:
+            break
+        j = filemap.find(b" ", i+19)
+        field = filemap[i:j]
+        count[field] += 1
+    new_count = {}
+    for k, v in count.items():
+        m = pat.search(k + b" ")
+        if m:
+            new_count[m.group(1)] = v
+    filemap.close()
+    fileobj.close()
+    return new_count
+
+def vectorized(file, workers=2, repeat=5):
+    # the numpy backends run on persistent pools, so that starting the
+    # workers and importing NumPy isn't part of the time
+    pools = [Pool(1), Pool(workers)]
+    variants = [
+        ("dalke-wf-10", lambda: dalke10(file)),
+        ("filter", lambda: count_file(file, QUERY, "filter", 1)),
+        ]
+    for pool in pools:
+        def run(pool=pool):
+            return pool.count_file(file, QUERY, "numpy")
+        variants.append(("numpy %d" % len(pool), run))
+    try:
+        count = None
+        for name, run in variants:
+            best = None
+            for i in range(repeat):
+                t0 = timer()
+                result = dict(run())
+                t = timer() - t0
+                if best is None or t < best:
+                    best = t
+            if count is None:
+                count = result
+            elif result != count:
+                raise AssertionError("%s gave different counts" % name)
+            show_results(name, best)
+    finally:
+        for pool in pools:
+            pool.close()
+
+def io(file, workers=2, repeat=3):
+    size = os.path.getsize(file) / 1048576.0
+    for backend, strategies in (("processes", STRATEGIES),
+                                ("mmap", MAP_STRATEGIES)):
+        for strategy in strategies:
+            best = None
+            for i in range(repeat):
+                # a new pool each time, since the workers keep the file
+                # mapped, and mapped pages aren't dropped
+                pool = Pool(workers)
+                try:
+                    pool.startup() # wait for the workers
+                    if not drop(file):
+                        raise RuntimeError("cannot drop %s from the cache"
+                                           % file)
+                    cached = resident(file)
+                    t0 = timer()
+                    pool.count_file(file, QUERY, backend, io=strategy)
+                    t = timer() - t0
+                finally:
+                    pool.close()
+                if best is None or t < best:
+                    best = t
+            name = "%s %s" % (backend, strategy or "default")
+            print("%-23s %4.6f seconds %8.1f MB/s (%d%% cached)" % (
+                name, best, size / best, 100 * (cached or 0)
+                ))
+
+def start(file, workers=2, repeat=5):
+    from wflib.prefork import STARTS
+    for method in STARTS:
+        best = slowest = total = None
+        for i in range(repeat):
+            t0 = timer()
+            pool = Pool(workers, start=method, patterns=[QUERY], files=[file])
+            try:
+                startup = pool.startup()
+                pool.count_file(file, QUERY, "mmap")
+                t = timer() - t0
+            finally:
+                pool.close()
+            if best is None or t < best:
+                best = t
+            if slowest is None or max(startup) < slowest:
+                slowest = max(startup)
+                total = sum(startup)
+        print("%-23s %4.6f seconds (workers started in %.6f seconds, "
+              "%.6f on average)" % (
+            method, best, slowest, total / len(startup)
+            ))
+
+BENCHMARKS = {
+    "transport": transport,
+    "reduce": reduce,
+    "numpy": vectorized,
+    "io": io,
+    "start": start,
+    }
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in BENCHMARKS:
+        print("Usage: %s %s [file [workers]]" % (
+            argv[0], "|".join(sorted(BENCHMARKS))
+            ))
+        sys.exit(1)
+    file = "o1000k.ap"
+    workers = 2
+    if len(argv) > 2:
+        file = argv[2]
+    if len(argv) > 3:
+        workers = int(argv[3])
+    BENCHMARKS[argv[1]](file, workers)
+
+if __name__ == "__main__":
+    main(sys.argv)
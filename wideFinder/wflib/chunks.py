@@ -0,0 +1,118 @@
+# chunk descriptors.  a chunk is a (start, size) pair that always covers
+# complete lines, so each chunk can be processed on its own.
+
+import os, threading
+from itertools import islice
+
+from wflib.stats import timer
+
+def getchunks(file, size=1024*1024, start=0, end=None):
+    # yield sequence of (start, size) chunk descriptors.  start must be
+    # at the beginning of a line (e.g. the end of an earlier chunk), and
+    # end, if given, must be at the end of a line.
+    f = open(file, "rb")
+    filesize = os.fstat(f.fileno()).st_size
+    if end is not None:
+        filesize = min(filesize, end)
+    f.seek(start)
+    while 1:
+        start = f.tell()
+        f.seek(size, 1)
+        s = f.readline() # skip forward to next line ending
+        # seeking past the end is allowed, so clip the last chunk
+        end = min(f.tell(), filesize)
+        if end > start:
+            yield start, end - start
+        if not s:
+            break
+    f.close()
+
+# the best chunk size depends on the machine and on the backend (see the
+# tables in dalke-wf-9.py and dalke-wf-11.py), so measure it instead.
+
+SIZES = (16*1024, 64*1024, 256*1024, 1024*1024, 4*1024*1024)
+SAMPLE = 4*1024*1024
+
+def lastline(file, start=0, end=None, block=64*1024):
+    # return the offset just past the last newline between start and end,
+    # or start if there is none.  used to leave out an incomplete last
+    # line in a file that is still being written.
+    f = open(file, "rb")
+    if end is None:
+        end = os.fstat(f.fileno()).st_size
+    pos = end
+    try:
+        while pos > start:
+            n = min(block, pos - start)
+            f.seek(pos - n)
+            i = f.read(n).rfind(b"\n")
+            if i >= 0:
+                return pos - n + i + 1
+            pos = pos - n
+        return start
+    finally:
+        f.close()
+
+def tunechunks(file, run, sizes=SIZES, sample=SAMPLE, workers=1):
+    # pick the chunk size that gives the best throughput for run, which
+    # takes a list of chunks and returns a list of results.  each size
+    # is timed on about sample bytes (and at least one chunk per worker)
+    # from the start of the file.  the timed chunks are real work, so
+    # this returns their results, the best size, and the offset where
+    # the rest of the file starts.
+    result = []
+    start = 0
+    best = None
+    for size in sizes:
+        chunks = list(islice(getchunks(file, size, start),
+                             max(workers, sample // size)))
+        if not chunks:
+            break # the entire file has been sampled
+        t0 = timer()
+        result.extend(run(chunks))
+        elapsed = max(timer() - t0, 1e-6)
+        start = chunks[-1][0] + chunks[-1][1]
+        rate = (start - chunks[0][0]) / elapsed
+        if best is None or rate > best[0]:
+            best = rate, size
+    if best is None:
+        return result, sizes[-1], start
+    return result, best[1], start
+
+class GuidedChunks(object):
+    # guided scheduling: an iterator that yields chunk descriptors on
+    # demand, starting with big chunks and making them smaller as the
+    # end of the file gets closer.  each chunk is 1/(factor*workers) of
+    # what's left (but never smaller than minsize), so the workers that
+    # go idle near the end pick up small pieces instead of waiting for
+    # one big chunk to finish.  can be shared between threads.
+
+    def __init__(self, file, workers=1, minsize=64*1024, factor=2, start=0):
+        self.file = open(file, "rb")
+        self.filesize = os.fstat(self.file.fileno()).st_size
+        self.workers = max(1, workers)
+        self.minsize = minsize
+        self.factor = factor
+        self.start = start
+        self.lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        self.lock.acquire()
+        try:
+            start = self.start
+            remaining = self.filesize - start
+            if remaining <= 0:
+                self.file.close()
+                raise StopIteration
+            size = max(self.minsize, remaining // (self.factor * self.workers))
+            self.file.seek(start + size)
+            self.file.readline() # skip forward to next line ending
+            self.start = min(self.file.tell(), self.filesize)
+            return start, self.start - start
+        finally:
+            self.lock.release()
+
+    __next__ = next # python 3
@@ -0,0 +1,270 @@
+# columnar log tables.  instead of running a regular expression over the
+# log for every question, parse each chunk of an Apache combined log once
+# into columns, and answer the questions from the columns:
+#
+#     log = wflib.parse("o1000k.ap", workers=2)
+#     log.count("status")                          # hits per status
+#     log.count("path", where={"status": 404})     # top 404s
+#     log.sum("bytes", by="path")                  # bytes per page
+#
+# each chunk becomes a Table.  the string columns (host, method, path,
+# referrer, agent) are dictionary-encoded: a list of the distinct values
+# in the chunk, and an array of indexes into that list, one per line.
+# status, bytes and time (seconds since the epoch, UTC) are plain
+# arrays.  tables are sent back from the worker processes as strings
+# (see Table.state), and the aggregations loop over the arrays instead
+# of over the text.  like the counts from count_file, the string values
+# are bytes (see compat.py).
+
+import re, calendar
+from array import array
+from collections import defaultdict
+from itertools import compress
+
+from wflib.compat import basestring, compile, encode, izip, tobytes
+
+# quoted fields can contain backslash escapes, like \".  no field can
+# contain a newline, so a broken line can't swallow the next one.
+QUOTED = r'[^"\\\n]*(?:\\[^\n][^"\\\n]*)*'
+
+LINE = compile(
+    r'^(\S+) \S+ \S+ \[([^]\n]+)\] '
+    r'"(\S*) ?(\S*)%s" (\d{3}) (\d+|-) "(%s)" "(%s)"'
+    % (QUOTED, QUOTED, QUOTED), re.M
+    )
+
+FIELDS = (
+    "host", "time", "method", "path", "status", "bytes", "referrer", "agent"
+    )
+
+CODED = ("host", "method", "path", "referrer", "agent")
+
+MONTHS = dict((name, i) for i, name in enumerate(
+    b"Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), 1
+    ))
+
+def parsetime(text):
+    # convert an Apache timestamp (01/Oct/2006:06:33:45 -0700) to seconds
+    # since the epoch.  returns 0 for timestamps that cannot be parsed.
+    try:
+        seconds = calendar.timegm((
+            int(text[7:11]), MONTHS[text[3:6]], int(text[0:2]),
+            int(text[12:14]), int(text[15:17]), int(text[18:20])
+            ))
+        offset = int(text[22:24]) * 3600 + int(text[24:26]) * 60
+    except (KeyError, ValueError):
+        return 0
+    if text[21:22] == b"-":
+        return seconds + offset
+    return seconds - offset
+
+class Column(object):
+    # a dictionary-encoded string column
+
+    def __init__(self, values, codes):
+        self.values = values # distinct values
+        self.codes = codes # array of indexes into values
+
+    @classmethod
+    def encode(cls, strings):
+        index = {}
+        setdefault = index.setdefault
+        codes = array("i", [setdefault(s, len(index)) for s in strings])
+        values = [None] * len(index)
+        for value, code in index.items():
+            values[code] = value
+        return cls(values, codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __iter__(self):
+        return (self.values[code] for code in self.codes)
+
+class Table(object):
+    # the parsed lines of one chunk
+
+    def __init__(self, columns, skipped=0):
+        self.columns = columns # field name -> Column or array
+        self.skipped = skipped # lines that didn't parse
+
+    @classmethod
+    def parse(cls, text, pat=LINE):
+        rows = pat.findall(text)
+        skipped = text.count(b"\n") - len(rows)
+        if text and not text.endswith(b"\n"):
+            skipped += 1 # last line has no newline
+        if rows:
+            fields = zip(*rows)
+        else:
+            fields = [()] * len(FIELDS)
+        columns = {}
+        for name, values in zip(FIELDS, fields):
+            if name in CODED:
+                columns[name] = Column.encode(values)
+            elif name == "time":
+                # timestamps repeat a lot; only parse each one once
+                times = Column.encode(values)
+                seconds = list(map(parsetime, times.values))
+                columns[name] = array("l", map(seconds.__getitem__,
+                                               times.codes))
+            elif name == "status":
+                columns[name] = array("H", map(int, values))
+            else:
+                columns[name] = array("l", [
+                    value != b"-" and int(value) or 0 for value in values
+                    ])
+        return cls(columns, max(0, skipped))
+
+    def __len__(self):
+        return len(self.columns["status"])
+
+    def state(self):
+        # return a marshal-friendly version of the table
+        columns = []
+        for name in FIELDS:
+            column = self.columns[name]
+            if isinstance(column, Column):
+                columns.append((name, None, column.values,
+                                tobytes(column.codes)))
+            else:
+                columns.append((name, column.typecode, None,
+                                tobytes(column)))
+        return ("table", self.skipped, columns)
+
+    @classmethod
+    def fromstate(cls, state):
+        columns = {}
+        for name, typecode, values, data in state[2]:
+            if typecode is None:
+                columns[name] = Column(values, array("i", data))
+            else:
+                columns[name] = array(typecode, data)
+        return cls(columns, state[1])
+
+    def select(self, where):
+        # return a list of flags, one per row, for the rows where each
+        # of the given columns has the given value, or None if no row
+        # can match
+        mask = True
+        for name, value in where.items():
+            column = self.columns[name]
+            if isinstance(column, Column):
+                try:
+                    value = column.values.index(encode(value))
+                except ValueError:
+                    return None
+                column = column.codes
+            flags = [item == value for item in column]
+            if mask is True:
+                mask = flags
+            else:
+                mask = [a and b for a, b in izip(mask, flags)]
+        return mask
+
+    def keys(self, name, mask=True):
+        # return the key column and a function that maps its items to
+        # values
+        column = self.columns[name]
+        if isinstance(column, Column):
+            items, decode = column.codes, column.values.__getitem__
+        else:
+            items, decode = column, None
+        if mask is not True:
+            items = compress(items, mask)
+        return items, decode
+
+    def count(self, name, where=None):
+        mask = True
+        if where:
+            mask = self.select(where)
+        if mask is None:
+            return {}
+        counts = defaultdict(int)
+        items, decode = self.keys(name, mask)
+        for item in items:
+            counts[item] += 1
+        return decoded(counts, decode)
+
+    def sum(self, name, by, where=None):
+        mask = True
+        if where:
+            mask = self.select(where)
+        if mask is None:
+            return {}
+        sums = defaultdict(int)
+        items, decode = self.keys(by, mask)
+        values = self.columns[name]
+        if mask is not True:
+            values = compress(values, mask)
+        for item, value in izip(items, values):
+            sums[item] += value
+        return decoded(sums, decode)
+
+def decoded(counts, decode):
+    if decode is None:
+        return counts
+    return dict((decode(code), value) for code, value in counts.items())
+
+def process_columns(file, chunk, pat):
+    # parse a chunk into a table, and return its state
+    f = open(file, "rb")
+    f.seek(chunk[0])
+    text = f.read(chunk[1])
+    f.close()
+    return Table.parse(text, pat).state()
+
+class Log(list):
+    # a list of tables, one per chunk.  the aggregations return the same
+    # kind of dictionaries as count_file, so wflib.top works on them.
+
+    def rows(self):
+        # number of parsed lines
+        return sum([len(table) for table in self])
+
+    def skipped(self):
+        return sum([table.skipped for table in self])
+
+    def column(self, name):
+        # iterate over all values in a column
+        for table in self:
+            for value in table.columns[name]:
+                yield value
+
+    def count(self, name, where=None):
+        # count the rows for each value of a column.  where is an optional
+        # dictionary mapping column names to values to select rows on.
+        return merged(table.count(name, where) for table in self)
+
+    def sum(self, name, by, where=None):
+        # add up a numeric column for each value of another column
+        return merged(table.sum(name, by, where) for table in self)
+
+def merged(partials):
+    count = defaultdict(int)
+    for partial in partials:
+        for key, value in partial.items():
+            count[key] += value
+    return count
+
+def parse(file, workers=1, chunksize=None, pattern=LINE, **options):
+    # parse a combined log into a Log.  with more than one worker (or
+    # with a pool), the chunks are parsed by worker processes.  pattern
+    # can be used for variants of the log format, as long as it has the
+    # same groups as LINE.  options are passed on to engines.runjobs.
+    from wflib.engines import runjobs, runserial, chunked, CHUNKSIZE
+    if isinstance(pattern, basestring):
+        pattern = compile(pattern, re.M)
+    chunksize = chunksize or CHUNKSIZE
+    if workers > 1 or options.get("pool") is not None:
+        result = runjobs("process_columns", file, pattern, (), workers,
+                         chunksize, **options)
+    else:
+        def run(chunks):
+            return runserial(((process_columns, file, chunk, pattern)
+                              for chunk in chunks), options.get("stats"))
+        result = chunked(file, chunksize, run)
+    return Log(Table.fromstate(state) for state in result)
@@ -0,0 +1,87 @@
+# python 2 and 3.  the engines work on bytes throughout: chunks are read
+# and mapped as bytes, so patterns are compiled as bytes patterns, and
+# the counts are keyed on the bytes that findall returns.  only the keys
+# that are reported (see engines.top) are decoded, so a run with many
+# unique keys doesn't decode the ones nobody looks at.  on python 2,
+# bytes is str, and all of this does nothing.
+
+import re, sys
+
+PY3 = sys.version_info[0] >= 3
+
+# text in patterns and keys.  surrogateescape keeps bytes that aren't
+# valid UTF-8, so decode(encode(text)) == text for any key.
+ENCODING = "utf-8"
+ERRORS = "surrogateescape"
+
+# the regular expression parser, for looking inside patterns (see
+# literal.py).  it moved into the re package in python 3.11, and the
+# old modules warn when they are imported.
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse, sre_constants
+
+if PY3:
+    import queue
+    basestring = (str, bytes)
+    integer = (int,)
+    izip = zip
+    imap = map
+    def encode(text):
+        # return text as bytes
+        if isinstance(text, str):
+            return text.encode(ENCODING, ERRORS)
+        return text
+    def decode(key):
+        # return a key (or a tuple of keys) as text
+        if isinstance(key, bytes):
+            return key.decode(ENCODING, ERRORS)
+        if isinstance(key, tuple):
+            return tuple(map(decode, key))
+        return key
+    def reraise(tp, value, tb):
+        raise value.with_traceback(tb)
+    def stdio():
+        # binary stdin and stdout, for the worker pipes
+        return sys.stdin.buffer, sys.stdout.buffer
+else:
+    import Queue as queue
+    from itertools import izip, imap
+    basestring = basestring
+    integer = (int, long)
+    def encode(text):
+        if isinstance(text, unicode):
+            return text.encode(ENCODING)
+        return text
+    def decode(key):
+        return key
+    exec("def reraise(tp, value, tb):\n    raise tp, value, tb\n")
+    def stdio():
+        return sys.stdin, sys.stdout
+
+def tobytes(a):
+    # array.tostring is called tobytes in python 3
+    if hasattr(a, "tobytes"):
+        return a.tobytes()
+    return a.tostring()
+
+def frombytes(a, data):
+    if hasattr(a, "frombytes"):
+        a.frombytes(data)
+    else:
+        a.fromstring(data)
+
+def compile(pattern, flags=0):
+    # compile a pattern (text, bytes, or a compiled pattern) for
+    # searching bytes.  anything else is assumed to be pattern-like
+    # already (see multi.py), and is returned as is.
+    if hasattr(pattern, "pattern"):
+        if not PY3 or not isinstance(pattern.pattern, str):
+            return pattern
+        flags, pattern = pattern.flags, pattern.pattern
+    elif not isinstance(pattern, basestring):
+        return pattern
+    if PY3:
+        flags &= ~re.UNICODE # not allowed for bytes
+    return re.compile(encode(pattern), flags)
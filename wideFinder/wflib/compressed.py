@@ -0,0 +1,390 @@
+# compressed logs.  getchunks needs seek, which doesn't work inside a
+# compressed stream, so compressed files are handled in one of two ways:
+#
+#     frames      if the file is made of independent gzip members (as
+#                 written by bgzip, or by concatenating gzip files), or
+#                 is a seekable zstd file (with a seek table at the end),
+#                 each worker decompresses and searches its own range of
+#                 members.  gzip member boundaries are guessed from the
+#                 headers, and the workers report where their members
+#                 really ended, so a wrong guess is noticed (and the file
+#                 is streamed instead).
+#     stream      otherwise, the file is decompressed by one worker, as
+#                 one job (process_stream), so a directory of rotated
+#                 .gz files is still decompressed in parallel.  if one
+#                 such file is most of the work, it is decompressed in
+#                 this process instead, and the text is handed to the
+#                 workers a block of lines at a time, so they share the
+#                 matching.  decompression then runs in a thread of its
+#                 own, a few blocks ahead of the workers (see readahead),
+#                 so it overlaps with matching without holding up the
+#                 pool threads that ask for the next block.
+#
+# a line belongs to the range it starts in: each range skips its first
+# partial line, and reads on into the next range to finish its last one.
+# zstd needs the zstandard module.
+
+import os, io, sys, zlib, mmap, struct, threading
+from collections import defaultdict
+
+from wflib.compat import queue, reraise
+
+BLOCK = 1024*1024 # uncompressed text searched at a time
+READ = 256*1024 # compressed data read at a time
+AHEAD = 4 # blocks decompressed ahead of the workers
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+SEEKABLE_MAGIC = 0x8F92EAB1
+SKIPPABLE_MAGIC = 0x184D2A5E
+
+SUFFIXES = {".gz": "gzip", ".zst": "zstd"}
+
+def codec(file):
+    # return "gzip" or "zstd" for a compressed file, or None
+    name, ext = os.path.splitext(file)
+    if ext in SUFFIXES:
+        return SUFFIXES[ext]
+    f = open(file, "rb")
+    head = f.read(4)
+    f.close()
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head == ZSTD_MAGIC:
+        return "zstd"
+    return None
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd files need the zstandard module")
+    return zstandard
+
+# --------------------------------------------------------------------
+# frame indexes
+
+def gzipheader(data, i):
+    # does a plausible gzip header start at data[i]?
+    if data[i:i+3] != GZIP_MAGIC or len(data) < i + 10:
+        return False
+    flags, xfl, system = struct.unpack("B4xBB", data[i+3:i+10])
+    return (not flags & 0xe0 and xfl in (0, 2, 4) and
+            (system <= 13 or system == 255))
+
+def bgzfsize(data, i):
+    # return the size of a BGZF block starting at data[i], or None if
+    # it's not one
+    if data[i:i+4] != GZIP_MAGIC + b"\x04" or len(data) < i + 18:
+        return None
+    xlen = struct.unpack("<H", data[i+10:i+12])[0]
+    j = i + 12
+    while j + 4 <= i + 12 + xlen:
+        tag, size = data[j:j+2], struct.unpack("<H", data[j+2:j+4])[0]
+        if tag == b"BC" and size == 2:
+            return struct.unpack("<H", data[j+4:j+6])[0] + 1
+        j += 4 + size
+    return None
+
+def gzipframes(file):
+    # return a list of (offset, uncompressed size) pairs for the gzip
+    # members in file, and (file size, 0).  for BGZF files, the member
+    # sizes are in the headers; for others, every plausible header is
+    # taken as the start of a member (see above).
+    size = os.path.getsize(file)
+    f = open(file, "rb")
+    try:
+        data = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        offsets = []
+        i = 0
+        while i < size:
+            n = bgzfsize(data, i)
+            if n is None:
+                break
+            offsets.append(i)
+            i += n
+        if i < size:
+            offsets = [0]
+            i = data.find(GZIP_MAGIC, 1)
+            while i != -1:
+                if gzipheader(data, i):
+                    offsets.append(i)
+                i = data.find(GZIP_MAGIC, i + 1)
+        # the uncompressed size is at the end of each member
+        found = [(i, struct.unpack("<I", data[j-4:j])[0])
+                 for i, j in zip(offsets, offsets[1:] + [size])]
+        return found + [(size, 0)]
+    finally:
+        data.close()
+
+def zstdframes(file):
+    # return a list of (offset, uncompressed size) pairs from the seek
+    # table of a seekable zstd file, or None if there isn't one.  the
+    # last pair is the offset of the seek table, and 0.
+    f = open(file, "rb")
+    try:
+        f.seek(0, 2)
+        size = f.tell()
+        if size < 17:
+            return None
+        f.seek(-9, 2)
+        n, flags, magic = struct.unpack("<IBI", f.read(9))
+        if magic != SEEKABLE_MAGIC:
+            return None
+        entry = 8 + (flags & 0x80 and 4)
+        f.seek(-9 - n * entry - 8, 2)
+        magic, length = struct.unpack("<II", f.read(8))
+        if magic != SKIPPABLE_MAGIC or length != n * entry + 9:
+            return None
+        table = f.read(n * entry)
+    finally:
+        f.close()
+    frames = []
+    offset = 0
+    for i in range(n):
+        csize, dsize = struct.unpack("<II", table[i*entry:i*entry+8])
+        frames.append((offset, dsize))
+        offset += csize
+    frames.append((offset, 0))
+    return frames
+
+def frames(file, kind):
+    # return the independent frames of a compressed file, followed by
+    # (end of the last frame, 0), or None if it has to be streamed
+    if kind == "gzip":
+        result = gzipframes(file)
+    else:
+        result = zstdframes(file)
+    if result and len(result) > 2:
+        return result
+    return None
+
+def ranges(file, kind, size):
+    # return a list of (uncompressed size, (start, size)) pairs, for
+    # ranges of about size compressed bytes that start at a frame, or
+    # None if the file has to be streamed
+    found = frames(file, kind)
+    if found is None:
+        return None
+    result = []
+    start = found[0][0]
+    total = 0
+    for offset, dsize in found[:-1]:
+        if offset - start >= size:
+            result.append((total, (start, offset - start)))
+            start, total = offset, 0
+        total += dsize
+    end = found[-1][0]
+    result.append((total, (start, end - start)))
+    return result
+
+# --------------------------------------------------------------------
+# decompression
+
+def gzipstream(f):
+    # decompress gzip members from the current position.  yields (text,
+    # end) pairs, where end is the file offset after the member that the
+    # text finishes, or None.  stops at the end of the file, or at
+    # something that doesn't look like a gzip member.
+    offset = f.tell()
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = b""
+    while 1:
+        if not data:
+            data = f.read(READ)
+            if not data:
+                # the member ended if a byte more is left over
+                try:
+                    d.decompress(b"x")
+                except zlib.error:
+                    return
+                if d.unused_data == b"x":
+                    yield b"", offset
+                return
+        text = d.decompress(data)
+        offset += len(data) - len(d.unused_data)
+        data = d.unused_data
+        if data:
+            yield text, offset
+            if not data.startswith(GZIP_MAGIC[:len(data)]):
+                return
+            d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            yield text, None
+
+def zstdstream(f, end=None):
+    # decompress zstd frames from the current position, like gzipstream.
+    # only the end of the given range is reported.
+    reader = zstandard().ZstdDecompressor()
+    offset = f.tell()
+    if end is not None:
+        stream = reader.stream_reader(io.BytesIO(f.read(end - offset)),
+                                      read_across_frames=True)
+        while 1:
+            text = stream.read(BLOCK)
+            if not text:
+                break
+            yield text, None
+        yield b"", end
+    stream = reader.stream_reader(f, read_across_frames=True)
+    while 1:
+        text = stream.read(READ)
+        if not text:
+            break
+        yield text, None
+
+def streamsize(file, kind):
+    # guess the uncompressed size of a file that has to be streamed, to
+    # order the jobs by.  for gzip, it's in the trailer (modulo 4 GB, and
+    # only for the last member); zstd doesn't say, so use the file size.
+    size = os.path.getsize(file)
+    if kind != "gzip" or size < 4:
+        return size
+    f = open(file, "rb")
+    try:
+        f.seek(-4, 2)
+        return struct.unpack("<I", f.read(4))[0]
+    finally:
+        f.close()
+
+def stream(f, kind, end=None):
+    if kind == "gzip":
+        return gzipstream(f)
+    return zstdstream(f, end)
+
+def blocks(file, kind, size=BLOCK):
+    # yield the text of a compressed file, a block of lines at a time
+    f = open(file, "rb")
+    try:
+        pieces = []
+        n = 0
+        for text, end in stream(f, kind):
+            pieces.append(text)
+            n += len(text)
+            if n >= size:
+                text = b"".join(pieces)
+                i = text.rfind(b"\n") + 1
+                if i:
+                    yield text[:i]
+                    text = text[i:]
+                pieces, n = [text], len(text)
+        text = b"".join(pieces)
+        if text:
+            yield text
+    finally:
+        f.close()
+
+def readahead(items, depth=AHEAD):
+    # iterate over items in a thread of its own, at most depth items
+    # ahead of the caller.  errors are raised in the caller.
+    q = queue.Queue(depth)
+    stop = threading.Event()
+    def put(item):
+        while not stop.isSet():
+            try:
+                q.put(item, True, 0.1)
+                return True
+            except queue.Full:
+                pass
+        return False # the caller has gone away
+    def run():
+        try:
+            for item in items:
+                if not put((True, item)):
+                    return
+        except Exception:
+            put((False, sys.exc_info()))
+            return
+        put((False, None))
+    t = threading.Thread(target=run)
+    t.setDaemon(1)
+    t.start()
+    try:
+        while 1:
+            more, item = q.get()
+            if more:
+                yield item
+            elif item is None:
+                break
+            else:
+                reraise(*item)
+    finally:
+        stop.set()
+
+# --------------------------------------------------------------------
+# processors
+
+def process_text(file, chunk, pat, text):
+    # search a block of text that was decompressed by the caller.  file
+    # and chunk are ignored.
+    d = defaultdict(int)
+    for page in pat.findall(text):
+        d[page] += 1
+    return d
+
+def process_stream(file, chunk, pat, kind):
+    # decompress and search an entire compressed file, a block of lines
+    # at a time.  the chunk is ignored.
+    d = defaultdict(int)
+    for text in blocks(file, kind):
+        for page in pat.findall(text):
+            d[page] += 1
+    return d
+
+def process_frames(file, chunk, pat, kind):
+    # decompress and search the frames in a chunk of a compressed file.
+    # returns ("frames", file, chunk, end, counts), where end is the
+    # offset just past the last frame that was read; it's the end of the
+    # chunk if the chunk really started and ended at frame boundaries.
+    start, size = chunk
+    d = defaultdict(int)
+    findall = pat.findall
+    def search(text, end=None):
+        for page in findall(text, 0, len(text) if end is None else end):
+            d[page] += 1
+    f = open(file, "rb")
+    f.seek(start)
+    skip = start > 0 # the first line belongs to the chunk before
+    inside = True
+    last = None
+    pieces = []
+    n = 0
+    try:
+        for text, end in stream(f, kind, start + size):
+            if not inside:
+                # finish the last line
+                i = text.find(b"\n") + 1
+                if i:
+                    pieces.append(text[:i])
+                    break
+                pieces.append(text)
+                continue
+            if skip:
+                i = text.find(b"\n") + 1
+                if not i:
+                    text = b""
+                else:
+                    text = text[i:]
+                    skip = False
+            pieces.append(text)
+            n += len(text)
+            if n >= BLOCK:
+                text = b"".join(pieces)
+                i = text.rfind(b"\n") + 1
+                search(text, i)
+                pieces, n = [text[i:]], len(text) - i
+            if end is not None and end >= start + size:
+                inside = False
+                last = end
+                if skip:
+                    break # no line starts in this chunk
+        search(b"".join(pieces))
+    except zlib.error:
+        # not a member boundary after all
+        return ("frames", file, chunk, None, {})
+    finally:
+        f.close()
+    return ("frames", file, chunk, last, dict(d))
@@ -0,0 +1,389 @@
+# wide finder backends.  a backend is a function
+#
+#     backend(file, pat, workers, chunksize) -> list of partial results
+#
+# where each partial result is a dictionary mapping matches to counts.
+# all backends return the same totals once the partials are merged, so
+# you can pick whichever one is fastest for a given file.
+#
+#     serial      one chunk at a time, in this process (wf-3.py)
+#     threads     chunks handed to worker threads (wf-4.py)
+#     processes   chunks read by worker processes (wf-5.py)
+#     mmap        chunks searched in mmap'ed files by worker processes (wf-6.py)
+#     filter      two-level filter, literal test before the RE (wf-2.py,
+#                 dalke-wf-10.py, see literal.py)
+#     numpy       dalke-wf-10.py's candidate search, vectorised with NumPy
+#                 on mmap'ed chunks (see vector.py)
+#
+# pass chunksize="auto" to pick the chunk size by timing a few sizes on
+# the start of the file, or chunksize="guided" to hand out smaller chunks
+# as the workers run out of work.  pass a Stats object as stats to see
+# how busy each worker was (see stats.py), and index=True to reuse the
+# counts for unchanged chunks from an earlier run (see index.py).  the
+# process backends also take a pool argument, to run on a persistent Pool
+# of worker processes instead of starting new ones (see pool.py), a
+# transport argument ("marshal" or "shm", see shm.py), a reduce
+# argument ("parent" or "shards", see shards.py), and a start argument
+# ("exec" or "fork", see prefork.py) for the pool they make.  pass approximate=k to
+# all backends to count only the k most common keys (see topk.py).
+# the serial, threads, processes and mmap backends take an io argument,
+# to give the kernel hints on how the file will be read (see advise.py).
+# count_many and find_many run several patterns in one pass over the
+# file (see multi.py), and count_files and find_files run a pattern over
+# many files (see files.py).
+#
+# the counts are keyed on bytes, and only the keys that top returns are
+# decoded (see compat.py).
+
+import os, sys, heapq
+from collections import defaultdict
+from operator import itemgetter
+
+import threading
+
+from wflib.advise import MAP_STRATEGIES
+from wflib.chunks import getchunks, tunechunks, GuidedChunks
+from wflib.compat import compile, decode, reraise
+from wflib.files import runfiles
+from wflib.index import Index
+from wflib.multi import Patterns, split
+from wflib.pool import Pool
+from wflib.shards import Shards
+from wflib.stats import timer
+from wflib.topk import summarize, summarize_job
+from wflib import literal, shm, vector
+from wflib.process import process, process_compiled
+
+CHUNKSIZE = 1024*1024
+
+# --------------------------------------------------------------------
+# workers
+
+class Worker(threading.Thread):
+    # run jobs in this process.  (seq, job) pairs are taken from a shared
+    # iterator whenever the worker is idle, so lazy job sequences (like
+    # GuidedChunks) see how much work is left.
+
+    def __init__(self, jobs, lock, result, index=0, stats=None):
+        threading.Thread.__init__(self)
+        self.setDaemon(1)
+        self.jobs = jobs
+        self.lock = lock
+        self.result = result
+        self.index = index
+        self.stats = stats
+        self.error = None
+
+    def run(self):
+        try:
+            while 1:
+                self.lock.acquire()
+                try:
+                    item = next(self.jobs, None)
+                finally:
+                    self.lock.release()
+                if item is None:
+                    break
+                t0 = timer()
+                seq, args = item
+                func, args = args[0], args[1:]
+                self.result.append((seq, func(*args)))  # list.append is atomic
+                if self.stats is not None:
+                    self.stats.add(self.index, timer() - t0)
+        except Exception:
+            self.error = sys.exc_info()
+
+def dispatch(workerclass, jobs, workers, stats=None):
+    # run jobs on a bunch of workers, and return the list of results
+    # (in the same order as the jobs)
+    jobs = enumerate(jobs)
+    lock = threading.Lock()
+    result = []
+    threads = []
+    for i in range(max(1, workers)):
+        w = workerclass(jobs, lock, result, i, stats)
+        w.start()
+        threads.append(w)
+    for w in threads:
+        w.join()
+    for w in threads:
+        if w.error:
+            reraise(*w.error)
+    result.sort(key=itemgetter(0))
+    return [item[1] for item in result]
+
+def chunked(file, chunksize, run, workers=1, cache=None):
+    # run the chunks of a file through run, which takes a sequence of
+    # chunks and returns a list of results.  chunksize can also be
+    # "auto", to tune the chunk size on the start of the file first, or
+    # "guided", to make the chunks smaller towards the end of the file
+    # (see chunks.py).  cache, if given, wraps run so that chunks that
+    # have been processed before are skipped (see index.py)
+    if cache is not None:
+        run = cache(run)
+    if chunksize == "auto":
+        result, size, start = tunechunks(file, run, workers=workers)
+        return result + run(getchunks(file, size, start))
+    if chunksize == "guided":
+        return run(GuidedChunks(file, workers))
+    return run(getchunks(file, chunksize))
+
+def runjobs(name, file, pat, args, workers, chunksize, pool=None,
+            stats=None, cache=None, transport="marshal", reduce="parent",
+            approximate=None, start="exec"):
+    # run a chunk processor on worker processes, on the given pool or
+    # on a temporary one.  with reduce="shards", the workers merge the
+    # results themselves (see shards.py).  with approximate=k, they send
+    # back summaries of at most k keys (see topk.py)
+    if pool is None:
+        pool = Pool(workers, transport, start, [pat], [file])
+        try:
+            if stats is not None:
+                pool.startup(stats)
+            return runjobs(name, file, pat, args, workers, chunksize, pool,
+                           stats, cache, transport, reduce, approximate)
+        finally:
+            pool.close()
+    if approximate:
+        def run(chunks):
+            return pool.map((("topk", approximate, name, file, chunk,
+                              spec(pat), args) for chunk in chunks), stats)
+        return chunked(file, chunksize, run, len(pool))
+    if reduce == "shards":
+        if cache is not None:
+            raise ValueError("cannot use an index with reduce='shards'")
+        batch = "%x-%x" % (os.getpid(), id(object()))
+        def run(chunks):
+            return pool.map((("collect", batch, name, file, chunk,
+                              spec(pat), args) for chunk in chunks), stats)
+        done = False
+        try:
+            chunked(file, chunksize, run, len(pool))
+            result = pool.reduce(batch)
+            done = True
+        finally:
+            if not done:
+                # don't leave the totals behind in a persistent pool
+                pool.discard(batch)
+        return result
+    elif reduce != "parent":
+        raise ValueError("unknown reduce mode: %r" % reduce)
+    def run(chunks):
+        return pool.map(((name, file, chunk, spec(pat), args)
+                         for chunk in chunks), stats)
+    return chunked(file, chunksize, run, len(pool), cache)
+
+def approximated(jobs, k):
+    # with approximate=k, summarize each chunk's result as soon as it's
+    # counted, like the workers do for "topk" jobs (see topk.py)
+    if not k:
+        return jobs
+    return ((summarize_job, k) + job for job in jobs)
+
+def runserial(jobs, stats=None):
+    # run jobs one at a time in this process
+    result = []
+    for job in jobs:
+        t0 = timer()
+        result.append(job[0](*job[1:]))
+        if stats is not None:
+            stats.add(0, timer() - t0)
+    return result
+
+def spec(pat):
+    # marshal-friendly version of a compiled pattern
+    return pat.pattern, pat.flags
+
+# --------------------------------------------------------------------
+# backends
+
+def serial(file, pat, workers=1, chunksize=None, stats=None, cache=None,
+           approximate=None, io=None, pool=None):
+    # the in-process backends take a pool too, and ignore it, so they can
+    # be run from Pool.count_file
+    def run(chunks):
+        return runserial(approximated(((process, file, chunk, pat, io)
+                                       for chunk in chunks), approximate),
+                         stats)
+    return chunked(file, chunksize or CHUNKSIZE, run, 1, cache)
+
+def threads(file, pat, workers=2, chunksize=None, stats=None, cache=None,
+            approximate=None, io=None, pool=None):
+    def run(chunks):
+        return dispatch(Worker, approximated(((process, file, chunk, pat, io)
+                                              for chunk in chunks),
+                                             approximate), workers, stats)
+    return chunked(file, chunksize or CHUNKSIZE, run, workers, cache)
+
+def processes(file, pat, workers=2, chunksize=None, io=None, **options):
+    return runjobs("process", file, pat, (io,), workers,
+                   chunksize or CHUNKSIZE, **options)
+
+def mmapped(file, pat, workers=2, chunksize=None, io=None, **options):
+    # use one large chunk per worker to keep the process communication
+    # down.  large files are mapped one chunk at a time (see process.py)
+    if io not in MAP_STRATEGIES:
+        raise ValueError("unknown io strategy for a map: %r" % io)
+    if not chunksize:
+        chunksize = os.path.getsize(file) // max(1, workers) // CHUNKSIZE
+        chunksize = max(1, chunksize) * CHUNKSIZE
+    return runjobs("process_mmap", file, pat, (io,), workers, chunksize,
+                   **options)
+
+def filtered(file, pat, workers=1, chunksize=None, stats=None, cache=None,
+             approximate=None, io=None, pool=None):
+    # find candidates using literal text from the pattern, and only run
+    # the RE on those (see literal.py).  the plans read some chunks and
+    # map others, so there's no io strategy to pick.
+    if io is not None:
+        raise ValueError("the filter backend takes no io strategy: %r" % io)
+    plan = literal.compile(pat)
+    def run(chunks):
+        return runserial(approximated(((process_compiled, file, chunk, pat,
+                                        plan) for chunk in chunks),
+                                      approximate), stats)
+    return chunked(file, chunksize or CHUNKSIZE, run, 1, cache)
+
+def vectorized(file, pat, workers=2, chunksize=None, io=None, **options):
+    # like mmap, but search for the candidates with NumPy.  patterns
+    # that don't have a "find" plan are searched by the mmap backend
+    vector.load() # fail early if NumPy isn't installed
+    if io not in MAP_STRATEGIES:
+        raise ValueError("unknown io strategy for a map: %r" % io)
+    plan = literal.compile(pat)
+    if plan[0] != "find":
+        return mmapped(file, pat, workers, chunksize, io, **options)
+    if not chunksize:
+        chunksize = os.path.getsize(file) // max(1, workers) // CHUNKSIZE
+        chunksize = max(1, chunksize) * CHUNKSIZE
+    return runjobs("process_numpy", file, pat, plan[1:] + (io,), workers,
+                   chunksize, **options)
+
+BACKENDS = {
+    "serial": serial,
+    "threads": threads,
+    "processes": processes,
+    "mmap": mmapped,
+    "filter": filtered,
+    "numpy": vectorized,
+    }
+
+# --------------------------------------------------------------------
+# api
+
+def merge(result):
+    # merge the partial results
+    count = defaultdict(int)
+    if isinstance(result, Shards):
+        # no keys in common, so there's nothing to add up
+        for item in result:
+            count.update(item.items())
+        return count
+    packed = []
+    for item in result:
+        if isinstance(item, shm.Packed):
+            packed.append(item) # added up by key id (see shm.py)
+            continue
+        for key, value in item.items():
+            count[key] += value
+    shm.merge(packed, count)
+    return count
+
+def top(count, n=10):
+    # return the n most common (key, count) pairs, most common first.
+    # ties are broken on the key, so all backends give the same list.
+    # the keys are decoded (see compat.py).
+    return [(decode(key), value) for key, value in
+            heapq.nlargest(n, count.items(), key=itemgetter(1, 0))]
+
+def count_file(file, pattern, backend="mmap", workers=2, chunksize=None,
+               **options):
+    # count all matches for pattern in file, using the given backend
+    # (a name from BACKENDS, or a backend function).  extra options are
+    # passed on to the backend (stats for all backends, pool for the
+    # process backends).  index can be an Index, a sidecar file name, or
+    # True to use the default sidecar file (see index.py).  if
+    # approximate is given, this returns a SpaceSaving summary of at
+    # most that many keys instead of a dictionary (see topk.py).
+    if not callable(backend):
+        try:
+            backend = BACKENDS[backend]
+        except KeyError:
+            raise ValueError("unknown backend: %r" % backend)
+    pattern = compile(pattern)
+    approximate = options.get("approximate")
+    index = options.pop("index", None)
+    if approximate and index:
+        raise ValueError("cannot use an index with approximate counts")
+    if approximate and options.get("reduce") == "shards":
+        raise ValueError("cannot use reduce='shards' with approximate counts")
+    if index is not None and index is not False:
+        if not isinstance(index, Index):
+            if index is True:
+                index = None
+            index = Index(file, index)
+        options["cache"] = index.cache(pattern)
+        if not chunksize:
+            # a fixed size, so the old chunks come out the same when the
+            # file grows (the mmap backend's default depends on the size)
+            chunksize = CHUNKSIZE
+    stats = options.get("stats")
+    t0 = timer()
+    result = backend(file, pattern, workers, chunksize, **options)
+    if stats is not None:
+        stats.elapsed += timer() - t0
+        stats.bytes += os.path.getsize(file)
+    if index is not None and index is not False:
+        index.save()
+    if approximate:
+        return summarize(result, approximate)
+    return merge(result)
+
+def find(file, pattern, backend="mmap", workers=2, chunksize=None, n=10,
+         **options):
+    # return the n most common matches for pattern in file, as (key,
+    # count) pairs, or (key, count, error) triples if approximate is given
+    count = count_file(file, pattern, backend, workers, chunksize, **options)
+    if options.get("approximate"):
+        return count.top(n)
+    return top(count, n)
+
+def count_many(file, patterns, backend="mmap", workers=2, chunksize=None,
+               **options):
+    # count all matches for several named patterns in one pass over
+    # file.  patterns is a Patterns object, or anything Patterns takes.
+    # returns a dictionary mapping names to counts.
+    if options.get("approximate"):
+        raise ValueError("cannot use approximate counts with several patterns")
+    if not isinstance(patterns, Patterns):
+        patterns = Patterns(patterns)
+    count = count_file(file, patterns, backend, workers, chunksize, **options)
+    return split(count, patterns.names())
+
+def find_many(file, patterns, backend="mmap", workers=2, chunksize=None,
+              n=10, **options):
+    # return the n most common matches for each of several named patterns
+    # (see count_many), as a dictionary mapping names to (key, count) pairs
+    count = count_many(file, patterns, backend, workers, chunksize, **options)
+    return dict((name, top(value, n)) for name, value in count.items())
+
+def count_files(paths, pattern, backend="mmap", workers=2, chunksize=None,
+                **options):
+    # count all matches for pattern in a set of files, given as file
+    # names, glob patterns or directories (see files.py).  the backend
+    # can be "serial", "threads", "processes" or "mmap"; options are
+    # pool, stats, transport, start and io.
+    pattern = compile(pattern)
+    stats = options.get("stats")
+    t0 = timer()
+    result = runfiles(paths, pattern, backend, workers, chunksize, **options)
+    if stats is not None:
+        stats.elapsed += timer() - t0
+    return merge(result)
+
+def find_files(paths, pattern, backend="mmap", workers=2, chunksize=None,
+               n=10, **options):
+    # return the n most common matches for pattern in a set of files
+    count = count_files(paths, pattern, backend, workers, chunksize,
+                        **options)
+    return top(count, n)
@@ -0,0 +1,222 @@
+# an event-driven pool of worker processes.  Pool runs one thread per
+# worker process, just to pass marshal frames back and forth.  EventPool
+# talks to all of its worker processes from a single select loop in the
+# calling thread instead, so a pool with hundreds of workers doesn't
+# need hundreds of threads:
+#
+#     pool = wflib.EventPool(4, depth=2)
+#     pool.find("o1000k.ap", pattern, "processes")
+#     pool.close()
+#
+# the workers can be forked as for Pool (see prefork.py).
+#
+# depth is the number of jobs sent to each worker ahead of time, which
+# hides the round trip for lots of small jobs (like many small files).
+# results must be read before the next one is written with the shm
+# transport, so depth is always 1 for that.  jobs are written to the
+# worker pipes without blocking, as select says they can take more, so
+# a large job can't get stuck behind a worker that is itself stuck
+# writing a large result.  POSIX only (select doesn't work on pipes on
+# Windows).
+
+import os, fcntl, select, subprocess
+from collections import deque
+
+from wflib.compat import integer
+from wflib.ipc import FrameReader, FrameWriter
+from wflib.pool import Pool, executable, environ, startup
+from wflib import prefork
+from wflib.shm import KeyTable, Packed, SharedBuffer
+from wflib.stats import timer
+
+class EventWorker(object):
+    # a worker process, and the jobs sent to it that haven't been
+    # answered yet
+
+    def __init__(self, index=0, transport="marshal", start="exec"):
+        self.index = index
+        self.process = None
+        self.buffer = None
+        if transport == "shm":
+            self.buffer = SharedBuffer()
+        elif transport != "marshal":
+            raise ValueError("unknown transport: %r" % transport)
+        prefork.check(start)
+        self.start_method = start
+        self.pending = deque() # (seq, time sent) for each job sent
+        self.last = 0.0 # time the last result came in
+        self.spawn()
+
+    def spawn(self):
+        args = []
+        if self.buffer is not None:
+            args.append(self.buffer.path)
+        self.spawned, self.ready = timer(), None
+        self.keys = KeyTable() # a new process has sent no keys yet
+        if self.start_method == "fork":
+            self.process = prefork.fork(args)
+        else:
+            self.process = subprocess.Popen(
+                executable + ["-m", "wflib.worker"] + args,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                env=environ
+                )
+        self.reader = FrameReader()
+        self.writer = FrameWriter() # jobs not written to the pipe yet
+        fd = self.process.stdin.fileno()
+        fcntl.fcntl(fd, fcntl.F_SETFL,
+                    fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+    def startup(self):
+        if self.ready is None:
+            return None
+        return self.ready - self.spawned
+
+    def fileno(self):
+        return self.process.stdout.fileno()
+
+    def send(self, seq, cmd):
+        if self.process is None:
+            self.spawn()
+        self.pending.append((seq, timer()))
+        self.writer.put(cmd)
+        self.flush()
+
+    def flush(self):
+        # write as much of the jobs sent as the pipe takes.  returns true
+        # if they're all written.
+        try:
+            return self.writer.write(self.process.stdin.fileno())
+        except OSError:
+            self.writer.clear() # read will notice
+            return True
+
+    def read(self):
+        # read what's available, and return a list of (seq, result,
+        # seconds) for the jobs that are done.  if the process died, the
+        # result is None for all jobs it had.
+        data = os.read(self.fileno(), 1024*1024)
+        if not data:
+            self.writer.clear()
+            self.process.wait()
+            self.process = None
+            done = [(seq, None, 0.0) for seq, t0 in self.pending]
+            self.pending.clear()
+            return done
+        if self.ready is None:
+            self.ready = timer()
+        done = []
+        for result in self.reader.feed(data):
+            if isinstance(result, integer):
+                result = Packed(self.buffer.read(result), self.keys)
+            seq, t0 = self.pending.popleft()
+            # a job sent ahead of time only starts when the one before
+            # it is done
+            t1 = timer()
+            done.append((seq, result, t1 - max(t0, self.last)))
+            self.last = t1
+        return done
+
+    def close(self):
+        if self.process is not None:
+            self.writer.put(None)
+            while not self.flush():
+                select.select([], [self.process.stdin], [])
+            self.process.wait()
+            self.process = None
+        if self.buffer is not None:
+            self.buffer.close(remove=True)
+
+class EventPool(Pool):
+
+    def __init__(self, workers=2, transport="marshal", depth=1,
+                 start="exec", patterns=(), files=()):
+        prefork.check(start)
+        if start == "fork":
+            prefork.warm(patterns, files)
+        self.workers = [EventWorker(i, transport, start)
+                        for i in range(max(1, workers))]
+        if transport == "shm":
+            depth = 1
+        self.depth = max(1, depth)
+
+    def __len__(self):
+        return len(self.workers)
+
+    def run(self, feed, stats=None):
+        # the event loop.  feed(worker) sends the worker its next job, if
+        # there is one.  returns the results in job order.
+        result = {}
+        error = None
+        for w in self.workers:
+            while len(w.pending) < self.depth and feed(w):
+                pass
+        while 1:
+            busy = [w for w in self.workers if w.pending]
+            if not busy:
+                break
+            writing = dict((w.process.stdin, w) for w in busy if w.writer)
+            readable, writable = select.select(busy, list(writing), [])[:2]
+            for f in writable:
+                writing[f].flush()
+            for w in readable:
+                for seq, value, seconds in w.read():
+                    if value is None:
+                        error = "worker process failed"
+                        continue
+                    result[seq] = value
+                    if stats is not None:
+                        stats.add(w.index, seconds)
+                if error is None:
+                    while len(w.pending) < self.depth and feed(w):
+                        pass
+        if error is not None:
+            raise RuntimeError(error)
+        return [result[seq] for seq in sorted(result)]
+
+    def map(self, jobs, stats=None):
+        # run a sequence of worker jobs, and return the list of results
+        # (in the same order as the jobs).  like Pool.map, the next job
+        # is only taken from jobs when a worker is ready for it.
+        jobs = enumerate(jobs)
+        errors = []
+        def feed(w):
+            if errors:
+                return False
+            try:
+                seq, job = next(jobs)
+            except StopIteration:
+                return False
+            except Exception as v:
+                errors.append("cannot get next job: %s" % v)
+                return False
+            w.send(seq, job)
+            return True
+        result = self.run(feed, stats)
+        if errors:
+            raise RuntimeError(errors[0])
+        return result
+
+    def startup(self, stats=None):
+        return startup(self, self.workers, stats)
+
+    def broadcast(self, cmds):
+        # send one command to each worker process, and return the list of
+        # results
+        cmds = dict(zip(self.workers, enumerate(cmds)))
+        def feed(w):
+            if w not in cmds:
+                return False
+            w.send(*cmds.pop(w))
+            return True
+        depth, self.depth = self.depth, 1
+        try:
+            return self.run(feed)
+        finally:
+            self.depth = depth
+
+    def close(self):
+        for w in self.workers:
+            w.close()
+        self.workers = []
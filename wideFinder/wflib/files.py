@@ -0,0 +1,178 @@
+# many files at once.  rotated logs come as directories full of files,
+# some of them compressed:
+#
+#     wflib.find_files("logs/access.log*", pattern, workers=8)
+#     wflib.find_files("logs/", pattern, workers=8)
+#
+# the paths can be file names, glob patterns or directories (which are
+# searched recursively), or a list of those.  every file becomes one or
+# more jobs on the same worker pool: files up to chunksize bytes are one
+# job each, and larger files are split into chunks.  compressed files
+# are split at their frames if they can be, and are one job each if not,
+# unless one of those is most of the work; that one is decompressed here
+# and handed out a block at a time (see compressed.py).  the jobs are
+# handed out largest first, so the small ones fill in the gaps at the
+# end; the blocks of a streamed file go before all of them.
+
+import os, glob
+from itertools import chain
+
+from wflib.advise import MAP_STRATEGIES
+from wflib.chunks import getchunks
+from wflib.compat import basestring
+from wflib.compressed import codec, ranges, blocks, readahead, streamsize
+from wflib.index import SUFFIX
+
+# processor for the uncompressed files, for each backend
+PROCESSORS = {
+    "serial": "process",
+    "threads": "process",
+    "processes": "process",
+    "mmap": "process_mmap",
+    }
+
+# a compressed file that can't be split is streamed in blocks if it's
+# more than this much of the (uncompressed) bytes to search
+DOMINANT = 0.5
+
+def expand(paths):
+    # return a sorted list of the files given by paths
+    if isinstance(paths, basestring):
+        paths = [paths]
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for dir, dirs, names in os.walk(path):
+                for name in names:
+                    files.add(os.path.join(dir, name))
+        elif os.path.exists(path):
+            files.add(path)
+        else:
+            found = glob.glob(path)
+            if not found:
+                raise IOError("no such file: %r" % path)
+            for name in found:
+                if os.path.isdir(name):
+                    files.update(expand(name))
+                else:
+                    files.add(name)
+    # leave out index sidecars (see index.py)
+    return sorted(name for name in files if not name.endswith(SUFFIX))
+
+def filejobs(files, chunksize, processor="process_mmap", io=None):
+    # return a list of (size, processor, file, chunk, args) jobs for a
+    # list of files, largest first, and a list of (file, codec) for the
+    # compressed file to stream in blocks, if any.  the sizes are
+    # uncompressed sizes (or guesses, see compressed.streamsize).
+    jobs = []
+    whole = [] # compressed files that can't be split
+    for file in files:
+        size = os.path.getsize(file)
+        if not size:
+            continue
+        kind = codec(file)
+        if kind is not None:
+            found = ranges(file, kind, chunksize)
+            if found is None:
+                whole.append((file, kind))
+            else:
+                for size, chunk in found:
+                    jobs.append((size, "process_frames", file, chunk, (kind,)))
+        elif size <= chunksize:
+            jobs.append((size, processor, file, (0, size), (io,)))
+        else:
+            for chunk in getchunks(file, chunksize):
+                jobs.append((chunk[1], processor, file, chunk, (io,)))
+    jobs, streamed = wholejobs(whole, jobs)
+    jobs.sort(key=lambda job: -job[0])
+    return jobs, streamed
+
+def wholejobs(whole, jobs=()):
+    # add one job each for the compressed files that can't be split at
+    # their frames, except for one that is more than DOMINANT of all the
+    # work; that one is streamed in blocks instead.  returns the jobs,
+    # and a list of (file, codec) to stream.
+    jobs = list(jobs)
+    sizes = [(streamsize(file, kind), file, kind) for file, kind in whole]
+    total = sum([job[0] for job in jobs]) + sum([item[0] for item in sizes])
+    streamed = []
+    for size, file, kind in sorted(sizes, reverse=True):
+        if not streamed and size > DOMINANT * total:
+            streamed.append((file, kind))
+        else:
+            jobs.append((size, "process_stream", file,
+                         (0, os.path.getsize(file)), (kind,)))
+    return jobs, streamed
+
+def streamjobs(streamed):
+    # yield jobs for the blocks of the streamed files.  the blocks are
+    # decompressed by a thread of their own (see compressed.py), so the
+    # pool thread that asks for the next job doesn't wait for it.
+    def texts():
+        for file, kind in streamed:
+            for text in blocks(file, kind):
+                yield file, text
+    if not streamed:
+        return
+    for file, text in readahead(texts()):
+        yield (0, "process_text", file, (0, 0), (text,))
+
+def checked(result):
+    # return the counts from a list of partial results, and a list of
+    # the files whose frames turned out to be wrong (see compressed.py)
+    counts = []
+    failed = set()
+    for item in result:
+        if isinstance(item, tuple) and item[0] == "frames":
+            tag, file, chunk, end, count = item
+            if end != chunk[0] + chunk[1]:
+                failed.add(file)
+            counts.append((file, count))
+        else:
+            counts.append((None, item))
+    return [count for file, count in counts if file not in failed], failed
+
+def runfiles(paths, pat, backend="mmap", workers=2, chunksize=None,
+             pool=None, stats=None, transport="marshal", io=None,
+             start="exec"):
+    # run the jobs for all files on a pool, or in this process, and
+    # return the list of partial results
+    from wflib.engines import dispatch, runserial, spec, Worker, CHUNKSIZE
+    from wflib.pool import Pool
+    from wflib.process import PROCESSORS as functions
+    try:
+        processor = PROCESSORS[backend]
+    except KeyError:
+        raise ValueError("unknown backend for several files: %r" % backend)
+    if processor == "process_mmap" and io not in MAP_STRATEGIES:
+        raise ValueError("unknown io strategy for a map: %r" % io)
+    files = expand(paths)
+    if stats is not None:
+        stats.bytes += sum(map(os.path.getsize, files))
+    jobs, streamed = filejobs(files, chunksize or CHUNKSIZE, processor, io)
+    def run(jobs):
+        if backend in ("serial", "threads"):
+            calls = ((functions[name], file, chunk, pat) + args
+                     for size, name, file, chunk, args in jobs)
+            if backend == "serial":
+                return runserial(calls, stats)
+            return dispatch(Worker, calls, workers, stats)
+        return pool.map(((name, file, chunk, spec(pat), args)
+                         for size, name, file, chunk, args in jobs), stats)
+    close = pool is None and backend not in ("serial", "threads")
+    if close:
+        pool = Pool(workers, transport, start, [pat])
+        if stats is not None:
+            pool.startup(stats)
+    try:
+        result, failed = checked(run(chain(streamjobs(streamed), jobs)))
+        if failed:
+            # stream the files with bad frame guesses instead
+            failed = [(file, codec(file)) for file in sorted(failed)]
+            again, streamed = wholejobs(failed)
+            again.sort(key=lambda job: -job[0])
+            result.extend(run(chain(streamjobs(streamed), again)))
+        return result
+    finally:
+        if close:
+            pool.close()
@@ -0,0 +1,67 @@
+# follow mode, for log files that are still being written to.  instead
+# of scanning the entire file every time, a Follower remembers how far
+# it got, and only processes complete lines appended since then:
+#
+#     follower = wflib.Follower("access.log", pattern)
+#     for result in follower.follow(60):
+#         print result # the running top ten, once a minute
+#
+# if the file is rotated (replaced by a new file, or truncated), the
+# follower starts over at the beginning of the new file, but keeps the
+# counts it has collected so far.  lines appended to the old file after
+# the last update are lost.
+
+import os, time
+from collections import defaultdict
+
+from wflib.chunks import getchunks, lastline
+from wflib.compat import compile
+from wflib.engines import CHUNKSIZE, merge, spec, top
+from wflib.process import process
+
+class Follower(object):
+
+    def __init__(self, file, pattern, pool=None, chunksize=CHUNKSIZE):
+        pattern = compile(pattern)
+        self.file = file
+        self.pat = pattern
+        self.pool = pool
+        self.chunksize = chunksize
+        self.count = defaultdict(int)
+        self.offset = 0 # where the next update starts
+        self.inode = None
+        self.rotations = 0
+
+    def update(self):
+        # process the lines added since the last update, and return the
+        # number of bytes processed
+        st = os.stat(self.file)
+        if self.inode is not None and (
+            st.st_ino != self.inode or st.st_size < self.offset):
+            self.offset = 0 # rotated
+            self.rotations += 1
+        self.inode = st.st_ino
+        end = lastline(self.file, self.offset, st.st_size)
+        if end <= self.offset:
+            return 0
+        chunks = getchunks(self.file, self.chunksize, self.offset, end)
+        if self.pool is not None:
+            result = self.pool.map(("process", self.file, chunk,
+                                    spec(self.pat), ()) for chunk in chunks)
+        else:
+            result = [process(self.file, chunk, self.pat) for chunk in chunks]
+        for key, value in merge(result).items():
+            self.count[key] += value
+        size = end - self.offset
+        self.offset = end
+        return size
+
+    def top(self, n=10):
+        return top(self.count, n)
+
+    def follow(self, interval=60.0, n=10):
+        # update every interval seconds, and yield the running top n
+        while 1:
+            self.update()
+            yield self.top(n)
+            time.sleep(interval)
@@ -0,0 +1,281 @@
+# synthetic access logs, for benchmarking without getdata.py's download,
+# and without o1000k.ap's hundred copies of the same 10k lines (which
+# all hit the same keys in the same order, so the counting dictionaries
+# never grow past the first copy).
+#
+#     python -m wflib.generate [options] file
+#
+# writes Apache combined format lines like the ones in o10k.ap:
+#
+#     host - - [01/Oct/2006:06:33:45 -0700] "GET path HTTP/1.1" 200 ...
+#
+# a match ratio of the lines are GET requests for the entries the
+# standard query looks for, /ongoing/When/200x/yyyy/mm/dd/Name, picked
+# from cardinality distinct entries with Zipfian popularity (the k'th
+# most popular one gets requested in proportion to 1/k**skew).  the
+# rest are feeds, images, HEAD requests and the like, which the query
+# must skip.  line lengths follow a lognormal distribution with the
+# given mean and standard deviation; the user agent is padded to make
+# up the length (lines that come out longer are left as they are, so
+# the mean is a little higher).
+#
+# the file is made of fixed-size blocks, and each block is generated
+# from its own random seed and written at its own offset, so the blocks
+# are generated in parallel on a Pool (see pool.py) and written straight
+# to the file.  the same settings always give the same file, whatever
+# the number of workers.
+
+from __future__ import print_function
+
+import os, sys, math, random
+from bisect import bisect
+
+BLOCKSIZE = 1024*1024
+
+SETTINGS = {
+    "cardinality": 5000, # distinct entries
+    "skew": 1.0, # Zipf exponent
+    "match": 0.1, # fraction of lines the standard query matches
+    "length": 200, # mean line length
+    "deviation": 64, # standard deviation of the line length
+    "seed": 0,
+    }
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+          "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+WORDS = [
+    "Dynamic", "IDE", "Open", "Data", "Not", "Gaming", "NXML", "Debbie",
+    "Java", "Ruby", "Erlang", "Python", "Atom", "Feed", "Wide", "Finder",
+    "Sun", "Photo", "Music", "Web", "Search", "Blog", "Tech", "Canada",
+    "Vancouver", "Rails", "Unicode", "XML", "HTTP", "REST", "Cars",
+    "Office", "Suites", "Construction", "RSSticker", "Lists", "Tools",
+    ]
+
+HOSTS = [
+    "host-%d-%d-%d-%d.patmedia.net", "%d-%d-%d-%d.dyn.grandenetworks.net",
+    "c%d%d%d%d.cable.wanadoo.nl", "%d.%d.%d.%d", "crawl-%d-%d-%d-%d.googlebot.com",
+    ]
+
+AGENTS = [
+    "NetNewsWire/2.0b37 (Mac OS X; Lite; http://ranchero.com/netnewswire/)",
+    "Mozilla/5.0 (Windows; U; Windows NT 5.1; en-US; rv:1.8.0.7) Gecko/20060909 Firefox/1.5.0.7",
+    "Mozilla/4.0 (compatible; MSIE 6.0; Windows NT 5.1; SV1)",
+    "Googlebot/2.1 (+http://www.google.com/bot.html)",
+    "Onfolio/2.02",
+    "BitTorrent/4.0.0",
+    ]
+
+# other things people fetch.  %s is replaced by an entry, in the ones
+# that look almost like a match.
+OTHER = [
+    ("GET", "/ongoing/ongoing.atom"),
+    ("GET", "/ongoing/ongoing.rss"),
+    ("GET", "/ongoing/"),
+    ("GET", "/ongoing/potd.png"),
+    ("GET", "/ongoing/When/200x/%s.png"),
+    ("GET", "/ongoing/When/200x/%s.html"),
+    ("HEAD", "/ongoing/When/200x/%s"),
+    ("POST", "/ongoing/When/200x/%s"),
+    ("GET", "/ongoing/What/Technology/"),
+    ("GET", "/robots.txt"),
+    ]
+
+STATUS = [(200, 0.75), (304, 0.15), (301, 0.05), (404, 0.05)]
+
+# start of the log, in seconds since the epoch, and seconds per line
+EPOCH = 1159709625 # 01/Oct/2006:06:33:45 -0700
+RATE = 0.05
+
+def entry(k):
+    # the k'th entry, as the key the query returns: yyyy/mm/dd/Name
+    day = (k * 7919) % 1826 # spread over 2003 to 2007
+    year, month, mday = 2003 + day // 365, (day % 365) // 31 % 12 + 1, day % 28 + 1
+    words = []
+    while 1:
+        words.append(WORDS[k % len(WORDS)])
+        k = k // len(WORDS)
+        if not k:
+            break
+    return "%04d/%02d/%02d/%s" % (year, month, mday, "-".join(words))
+
+tables = {} # (cardinality, skew) -> cumulative weights
+
+def zipf(cardinality, skew):
+    key = cardinality, skew
+    table = tables.get(key)
+    if table is None:
+        table, total = [], 0.0
+        for k in range(1, cardinality + 1):
+            total += 1.0 / k ** skew
+            table.append(total)
+        tables.clear() # only keep one
+        tables[key] = table
+    return table
+
+def pick(rng, table):
+    # index of a random entry, weighted by table
+    return min(bisect(table, rng.random() * table[-1]), len(table) - 1)
+
+def timestamp(t):
+    t = int(t) - 7 * 3600 # -0700
+    days, seconds = divmod(t, 86400)
+    # civil date from days since 1970-01-01 (Howard Hinnant's algorithm)
+    days += 719468
+    era = days // 146097
+    doe = days - era * 146097
+    yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+    doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+    mp = (5 * doy + 2) // 153
+    mday = doy - (153 * mp + 2) // 5 + 1
+    month = mp + 3 - 12 * (mp >= 10)
+    year = yoe + era * 400 + (month <= 2)
+    return "%02d/%s/%04d:%02d:%02d:%02d -0700" % (
+        mday, MONTHS[month - 1], year,
+        seconds // 3600, seconds // 60 % 60, seconds % 60
+        )
+
+def lognormal(mean, deviation):
+    # mu and sigma for a lognormal distribution with this mean and
+    # standard deviation
+    sigma2 = math.log(1 + (float(deviation) / mean) ** 2)
+    return math.log(mean) - sigma2 / 2, math.sqrt(sigma2)
+
+def line(rng, settings, table, length, t):
+    # one log line, as text, and whether the query matches it.  length
+    # is (mu, sigma) for the line length (see lognormal).
+    host = HOSTS[int(rng.random() * len(HOSTS))] % tuple(
+        int(rng.random() * 256) for i in range(4)
+        )
+    k = pick(rng, table)
+    matched = rng.random() < settings["match"]
+    if matched:
+        method, path = "GET", "/ongoing/When/200x/" + entry(k)
+    else:
+        method, path = OTHER[int(rng.random() * len(OTHER))]
+        if "%s" in path:
+            path = path % entry(k)
+    r = rng.random()
+    for status, p in STATUS:
+        r -= p
+        if r < 0:
+            break
+    if status == 304:
+        size = "-"
+    else:
+        size = str(int(rng.random() * 50000))
+    text = '%s - - [%s] "%s %s HTTP/1.1" %d %s "-" "%s' % (
+        host, timestamp(t), method, path, status, size,
+        AGENTS[int(rng.random() * len(AGENTS))]
+        )
+    pad = int(rng.lognormvariate(*length)) - len(text) - 2
+    if pad > 0:
+        text += pad_agent(pad)
+    return text + '"\n', matched
+
+def pad_agent(n):
+    # n characters to lengthen a user agent with
+    filler = " (compatible; %s)" % "; ".join(WORDS)
+    return (filler * (n // len(filler) + 1))[:n]
+
+def generate_block(file, block, blocksize, settings):
+    # write block number block of the log to file, which must already
+    # be that large.  returns the number of lines, and the number of them
+    # that match.
+    rng = random.Random(settings["seed"] * 1000003 + block)
+    table = zipf(settings["cardinality"], settings["skew"])
+    length = lognormal(settings["length"], settings["deviation"])
+    t = EPOCH + block * blocksize / float(settings["length"]) * RATE
+    lines, size, count, matches = [], 0, 0, 0
+    while 1:
+        text, matched = line(rng, settings, table, length, t)
+        if size + len(text) > blocksize:
+            break
+        lines.append(text)
+        size += len(text)
+        count += 1
+        matches += matched
+        t += RATE
+    if not lines:
+        raise ValueError("block size too small")
+    # pad the last line to fill the block exactly
+    last = lines[-1]
+    lines[-1] = last[:-2] + pad_agent(blocksize - size) + last[-2:]
+    data = "".join(lines).encode("latin-1")
+    f = open(file, "r+b")
+    try:
+        f.seek(block * blocksize)
+        f.write(data)
+    finally:
+        f.close()
+    return count, matches
+
+def generate(file, size, workers=2, blocksize=BLOCKSIZE, pool=None,
+             **settings):
+    # write a log of about size bytes (a whole number of blocks) to
+    # file.  returns the number of lines, and the number that match.
+    for key in settings:
+        if key not in SETTINGS:
+            raise TypeError("unknown setting: %r" % key)
+    options = dict(SETTINGS)
+    options.update(settings)
+    blocks = max(1, -(-size // blocksize))
+    f = open(file, "wb")
+    try:
+        f.truncate(blocks * blocksize)
+    finally:
+        f.close()
+    jobs = [("generate", file, block, blocksize, options)
+            for block in range(blocks)]
+    if workers <= 1 and pool is None:
+        result = [generate_block(*job[1:]) for job in jobs]
+    elif pool is None:
+        from wflib.pool import Pool
+        pool = Pool(workers)
+        try:
+            result = pool.map(jobs)
+        finally:
+            pool.close()
+    else:
+        result = pool.map(jobs)
+    return sum([r[0] for r in result]), sum([r[1] for r in result])
+
+def main(argv):
+    from optparse import OptionParser
+    parser = OptionParser(usage="%prog [options] file")
+    parser.add_option("-s", "--size", type="float", default=200,
+                      help="size in megabytes [%default]")
+    parser.add_option("-w", "--workers", type="int", default=2,
+                      help="worker processes [%default]")
+    parser.add_option("-c", "--cardinality", type="int",
+                      default=SETTINGS["cardinality"],
+                      help="distinct entries [%default]")
+    parser.add_option("-z", "--skew", type="float", default=SETTINGS["skew"],
+                      help="Zipf exponent for entry popularity [%default]")
+    parser.add_option("-m", "--match", type="float",
+                      default=SETTINGS["match"],
+                      help="fraction of lines that match [%default]")
+    parser.add_option("-l", "--length", type="int",
+                      default=SETTINGS["length"],
+                      help="mean line length [%default]")
+    parser.add_option("-d", "--deviation", type="int",
+                      default=SETTINGS["deviation"],
+                      help="standard deviation of the line length "
+                      "[%default]")
+    parser.add_option("--seed", type="int", default=SETTINGS["seed"],
+                      help="random seed [%default]")
+    options, args = parser.parse_args(argv[1:])
+    if len(args) != 1:
+        parser.error("expected one file name")
+    lines, matches = generate(
+        args[0], int(options.size * 1024 * 1024), options.workers,
+        cardinality=options.cardinality, skew=options.skew,
+        match=options.match, length=options.length,
+        deviation=options.deviation, seed=options.seed
+        )
+    print("%s: %d bytes, %d lines, %d matches" % (
+        args[0], os.path.getsize(args[0]), lines, matches
+        ))
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,154 @@
+# chunk index.  a sidecar file that remembers the partial counts for
+# each chunk of a log file, so that a rerun with the same pattern only
+# has to process the chunks that are new or have changed:
+#
+#     wflib.find("access.log", pattern, index=True)
+#
+# stores the partials in access.log.wfi.  entries are keyed on the
+# pattern and the chunk's offset and size.  for an append-only log, the
+# chunks before the old end of the file come out the same on every run
+# (with a fixed chunk size; count_file uses CHUNKSIZE when it's given an
+# index), so only the tail is processed again.
+#
+# the index also keeps the size and modification time the file had, and
+# checks the cached chunks no harder than it has to:
+#
+#     unchanged   same size and time: the entries are used as they are,
+#                 without reading the file
+#     grown       the file was appended to: a cached chunk is checked
+#                 against a CRC of its first and last few bytes, so a
+#                 rerun only reads the new data (and a little of the
+#                 old).  an edit in the middle of an old chunk, made at
+#                 the same time as an append, goes unnoticed.
+#     otherwise   same size, new time (edited in place), or
+#                 verify="full": a cached chunk is checked against a
+#                 CRC of the whole chunk, which means reading all of it
+#                 again (but not matching it).
+#
+# if the file is replaced (a new inode) or shrinks, the index starts over.
+
+import os, sys, marshal, zlib, hashlib
+
+SUFFIX = ".wfi"
+BLOCKSIZE = 1024*1024 # bytes read at a time for the CRC
+EDGE = 256 # bytes from each end of a chunk, for the cheap check
+VERIFY = ("edges", "full")
+
+def patternkey(pat):
+    return hashlib.md5(repr((pat.pattern, pat.flags)).encode()).hexdigest()
+
+class Index(object):
+
+    def __init__(self, file, path=None, verify="edges"):
+        if verify not in VERIFY:
+            raise ValueError("unknown verify mode: %r" % verify)
+        self.file = file
+        self.path = path or file + SUFFIX
+        self.verify = verify
+        st = os.stat(file)
+        self.ident = st.st_dev, st.st_ino
+        self.stamp = st.st_size, st.st_mtime
+        self.old = None # the stamp from the last run
+        self.entries = {} # (patternkey, start, size) -> (edges, crc, partial)
+        self.used = set()
+        self.load()
+
+    def load(self):
+        try:
+            f = open(self.path, "rb")
+        except IOError:
+            return
+        try:
+            try:
+                data = marshal.load(f)
+            except (EOFError, ValueError, TypeError):
+                return # damaged; start over
+        finally:
+            f.close()
+        if (tuple(data.get("ident", ())) == self.ident and "stamp" in data
+            and data["stamp"][0] <= self.stamp[0]):
+            self.entries = data["entries"]
+            self.old = tuple(data["stamp"])
+
+    def save(self):
+        # drop the entries for this run's patterns that weren't used (the
+        # chunks have changed), and write the index
+        patterns = set(key[0] for key in self.used)
+        entries = {}
+        for key, value in self.entries.items():
+            if key in self.used or key[0] not in patterns:
+                entries[key] = value
+        tmp = self.path + ".tmp"
+        f = open(tmp, "wb")
+        try:
+            marshal.dump({"ident": self.ident, "stamp": self.stamp,
+                          "entries": entries}, f)
+        finally:
+            f.close()
+        if sys.platform == "win32" and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp, self.path)
+        self.old = self.stamp
+
+    def crc(self, f, start, size):
+        # CRC of part of the file (the same on python 2 and 3)
+        f.seek(start)
+        crc = 0
+        while size > 0:
+            data = f.read(min(size, BLOCKSIZE))
+            if not data:
+                break
+            crc = zlib.crc32(data, crc)
+            size -= len(data)
+        return crc & 0xffffffff
+
+    def edges(self, f, chunk):
+        # CRC of the first and last few bytes of a chunk
+        start, size = chunk
+        if size <= 2 * EDGE:
+            return self.crc(f, start, size)
+        return self.crc(f, start + size - EDGE, EDGE) ^ (
+            self.crc(f, start, EDGE) << 1)
+
+    def check(self, f, chunk, entry):
+        # is a cached entry still good for this chunk?
+        if self.old == self.stamp:
+            return True # the file hasn't changed
+        if self.verify == "edges" and self.old[0] < self.stamp[0]:
+            return entry[0] == self.edges(f, chunk)
+        return entry[1] == self.crc(f, chunk[0], chunk[1])
+
+    def cache(self, pat):
+        # return a function that wraps a chunk runner (see engines.chunked)
+        # so that chunks found in the index are not processed again
+        patkey = patternkey(pat)
+        st = os.stat(self.file)
+        self.stamp = st.st_size, st.st_mtime
+        def wrap(run):
+            def cached(chunks):
+                result = []
+                missed = []
+                f = open(self.file, "rb")
+                def misses():
+                    for chunk in chunks:
+                        key = (patkey,) + tuple(chunk)
+                        entry = self.entries.get(key)
+                        self.used.add(key)
+                        if entry is not None and self.check(f, chunk, entry):
+                            result.append(entry[2])
+                        else:
+                            missed.append((key, chunk))
+                            yield chunk
+                try:
+                    new = run(misses())
+                    for (key, chunk), partial in zip(missed, new):
+                        self.entries[key] = (
+                            self.edges(f, chunk),
+                            self.crc(f, chunk[0], chunk[1]),
+                            dict(partial.items())
+                            )
+                finally:
+                    f.close()
+                return result + new
+            return cached
+        return wrap
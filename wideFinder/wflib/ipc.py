@@ -0,0 +1,88 @@
+# length-prefixed marshal frames, used to talk to worker processes
+# over their stdin/stdout pipes (see wf-5.py)
+
+import os, sys, errno, marshal, struct
+from collections import deque
+
+def frame(object):
+    data = marshal.dumps(object)
+    return struct.pack("I", len(data)) + data
+
+def putobject(file, object):
+    file.write(frame(object))
+    file.flush()
+
+def getobject(file):
+    try:
+        n = struct.unpack("I", file.read(4))[0]
+    except struct.error:
+        return None
+    return marshal.loads(file.read(n))
+
+class FrameReader(object):
+    # decode frames from a non-blocking pipe, as the data arrives.  the
+    # pieces are only joined once a whole header or object is there, so
+    # large objects aren't copied over and over.
+
+    def __init__(self):
+        self.pieces = []
+        self.size = 0
+        self.frame = None # size of the current object, once known
+        self.need = 4
+
+    def feed(self, data):
+        # add data read from the pipe, and return a list of the objects
+        # that are now complete
+        self.pieces.append(data)
+        self.size += len(data)
+        result = []
+        while self.size >= self.need:
+            data = b"".join(self.pieces)
+            if self.frame is None:
+                self.frame = self.need = struct.unpack("I", data[:4])[0]
+                data = data[4:]
+            else:
+                result.append(marshal.loads(data[:self.frame]))
+                data = data[self.frame:]
+                self.frame = None
+                self.need = 4
+            self.pieces = [data]
+            self.size = len(data)
+        return result
+
+class FrameWriter(object):
+    # encode frames for a non-blocking pipe, and write them as the pipe
+    # takes them.  at most PIPE bytes are copied per write, so a large
+    # object isn't copied over and over either.
+
+    PIPE = 65536
+
+    def __init__(self):
+        self.pieces = deque()
+        self.offset = 0 # how much of the first piece is written
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def put(self, object):
+        self.pieces.append(frame(object))
+
+    def write(self, fd):
+        # write what the pipe takes, and return true if nothing is left
+        while self.pieces:
+            data = self.pieces[0]
+            try:
+                n = os.write(fd, data[self.offset:self.offset + self.PIPE])
+            except OSError:
+                if sys.exc_info()[1].errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return False
+                raise
+            self.offset += n
+            if self.offset >= len(data):
+                self.pieces.popleft()
+                self.offset = 0
+        return True
+
+    def clear(self):
+        self.pieces.clear()
+        self.offset = 0
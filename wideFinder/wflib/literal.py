@@ -0,0 +1,226 @@
+# two-level filter compiler.  dalke-wf-10.py gets its speed by looking
+# for the literal text that every match starts with using find, counting
+# the raw candidate fields up to the next space, and running the RE only
+# once per unique candidate afterwards.  compile looks at a pattern and
+# works out which version of that trick can be used for it:
+#
+#     ("find", prefix, stop, tail)
+#         every match starts with prefix, and ends tail characters after
+#         the first stop character following the prefix (see process_find)
+#     ("lines", literal)
+#         every match lies within a single line, and contains literal (the
+#         line filter from wf-2.py, see process.process_filter)
+#     ("findall",)
+#         no useful literal, so just use pat.findall
+#
+# the "find" plan gives the same counts as findall.  candidates that
+# overlap (because the prefix shows up again inside a candidate) are
+# handed to findall as is, so the RE gets to decide which one matches.
+# the pattern is looked at one character at a time, and the literals in
+# the plan are bytes, like the text they are looked for in.
+
+import os, re
+from collections import defaultdict
+
+from wflib.compat import PY3, basestring, sre_parse
+from wflib.compat import sre_constants as c
+
+MINLITERAL = 3 # shorter literals aren't worth it
+
+UNSUPPORTED = (c.AT, c.ASSERT, c.ASSERT_NOT, c.GROUPREF_EXISTS)
+
+CATEGORIES = {
+    c.CATEGORY_DIGIT: br"\d", c.CATEGORY_NOT_DIGIT: br"\D",
+    c.CATEGORY_SPACE: br"\s", c.CATEGORY_NOT_SPACE: br"\S",
+    c.CATEGORY_WORD: br"\w", c.CATEGORY_NOT_WORD: br"\W",
+    }
+
+class Unsupported(Exception):
+    pass
+
+def tobytes(text):
+    # the characters from sre_parse (which are all < 256 for a bytes
+    # pattern) as bytes
+    return bytes(bytearray([ord(ch) for ch in text]))
+
+def canmatch(items, ch, flags):
+    # can this part of a parsed pattern match the character ch?  raises
+    # Unsupported for anchors and lookarounds, which look outside the
+    # text they match.  errs on the side of yes.
+    for op, av in items:
+        if op in UNSUPPORTED:
+            raise Unsupported(op)
+        if op == c.LITERAL:
+            if chr(av) == ch:
+                return True
+        elif op == c.NOT_LITERAL:
+            if chr(av) != ch:
+                return True
+        elif op == c.ANY:
+            if ch != "\n" or flags & c.SRE_FLAG_DOTALL:
+                return True
+        elif op == c.IN:
+            if inset(av, ch, flags):
+                return True
+        elif op in (c.MAX_REPEAT, c.MIN_REPEAT):
+            if av[1] and canmatch(av[2], ch, flags):
+                return True
+        elif op == c.SUBPATTERN:
+            if canmatch(av[-1], ch, flags):
+                return True
+        elif op == c.BRANCH:
+            for item in av[1]:
+                if canmatch(item, ch, flags):
+                    return True
+        else:
+            return True # GROUPREF and friends; can't tell
+    return False
+
+def inset(items, ch, flags):
+    # does a character set match ch?
+    negate = 0
+    for op, av in items:
+        if op == c.NEGATE:
+            negate = 1
+        elif op == c.LITERAL:
+            if chr(av) == ch:
+                return not negate
+        elif op == c.RANGE:
+            if av[0] <= ord(ch) <= av[1]:
+                return not negate
+        elif op == c.CATEGORY:
+            if av not in CATEGORIES:
+                return True
+            if re.match(CATEGORIES[av], tobytes(ch), flags):
+                return not negate
+        else:
+            return True
+    return negate
+
+def compile(pat):
+    # work out a filter plan for a compiled pattern (see above)
+    if pat.flags & c.SRE_FLAG_IGNORECASE:
+        return ("findall",)
+    if not isinstance(pat.pattern, basestring):
+        return ("findall",) # several patterns (see multi.py)
+    items = list(sre_parse.parse(pat.pattern, pat.flags))
+    n = 0
+    while n < len(items) and items[n][0] == c.LITERAL:
+        n += 1
+    m = len(items)
+    while m > n and items[m-1][0] == c.LITERAL:
+        m -= 1
+    prefix = "".join([chr(av) for op, av in items[:n]])
+    suffix = "".join([chr(av) for op, av in items[m:]])
+    try:
+        if len(prefix) >= MINLITERAL and suffix:
+            if not canmatch(items[n:m], suffix[0], pat.flags):
+                return ("find", tobytes(prefix), tobytes(suffix[0]),
+                        len(suffix))
+        if not canmatch(items, "\n", pat.flags):
+            literal = longest(items)
+            if len(literal) >= MINLITERAL:
+                return ("lines", tobytes(literal))
+    except Unsupported:
+        pass
+    return ("findall",)
+
+def longest(items):
+    # return the longest run of literal text in a parsed pattern.  only
+    # looks at the top level, where everything is required.
+    best = run = ""
+    for op, av in items:
+        if op == c.LITERAL:
+            run += chr(av)
+            if len(run) > len(best):
+                best = run
+        else:
+            run = ""
+    return best
+
+def validate(pat, raw, count):
+    # add the raw candidate counts that match pat to count, using the
+    # same keys as findall
+    match = pat.match
+    groups = pat.groups
+    for text, value in raw.items():
+        m = match(text)
+        if m is None or m.end() != len(text):
+            continue
+        if groups == 0:
+            key = m.group()
+        elif groups == 1:
+            key = m.group(1) or b""
+        else:
+            key = m.groups(b"")
+        count[key] += value
+
+def process_find(file, chunk, pat, prefix, stop, tail):
+    # count matches using the "find" plan (see above).  on python 3, the
+    # chunk is searched in place in a memory map (like dalke-wf-10.py),
+    # and the candidates are memoryview slices of the map, so nothing is
+    # copied until validate looks at the distinct candidates.  python 2
+    # reads the chunk instead: its mmap.find is a simple loop, a lot
+    # slower than str.find, and its memoryviews can't be dict keys.
+    if not chunk[1]:
+        return defaultdict(int)
+    if not PY3:
+        f = open(file, "rb")
+        f.seek(chunk[0])
+        text = f.read(chunk[1])
+        f.close()
+        return scan(text, text, 0, len(text), pat, prefix, stop, tail)
+    from wflib.process import maps, mapwindow, WINDOW
+    windowed = os.path.getsize(file) > WINDOW
+    if windowed:
+        filemap, offset = mapwindow(file, chunk)
+    else:
+        filemap, offset = maps.get(file), 0
+    view = memoryview(filemap)
+    try:
+        start = chunk[0] - offset
+        return scan(filemap, view, start, start + chunk[1], pat, prefix,
+                    stop, tail)
+    finally:
+        view.release() # before the map is closed
+        if windowed:
+            filemap.close()
+
+def scan(text, view, start, end, pat, prefix, stop, tail):
+    # count the matches in text[start:end].  the candidates are counted
+    # as slices of view, which is either text itself or a memoryview of
+    # it.
+    d = defaultdict(int)
+    # for the first pass, count everything that looks like a match.
+    # it's faster to count everything and filter later than it is to
+    # do the filtering now (see dalke-wf-10.py)
+    raw = defaultdict(int)
+    find = text.find
+    skip = len(prefix)
+    i = find(prefix, start, end)
+    while i != -1:
+        j = find(stop, i + skip, end)
+        if j == -1:
+            break # no more complete candidates
+        j = min(j + tail, end)
+        k = find(prefix, i + 1, end)
+        if k == -1 or k >= j:
+            raw[view[i:j]] += 1
+            i = k
+            continue
+        # overlapping candidates; let the RE sort them out
+        first = i
+        while k != -1 and k < j:
+            i = find(stop, k + skip, end)
+            if i == -1:
+                break
+            j = max(j, min(i + tail, end))
+            k = find(prefix, k + 1, end)
+        for key in pat.findall(text, first, j):
+            d[key] += 1
+        i = k
+    if view is not text:
+        # only the distinct candidates are copied
+        raw = dict((bytes(key), value) for key, value in raw.items())
+    validate(pat, raw, d)
+    return d
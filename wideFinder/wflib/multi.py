@@ -0,0 +1,65 @@
+# several reports in one pass.  a Patterns object holds a set of named
+# patterns, and looks enough like a single compiled pattern to be passed
+# to any backend:
+#
+#     reports = wflib.Patterns({
+#         "pages": r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) ",
+#         "status": r"HTTP/1\.[01]\" (\d+)",
+#         })
+#     count = wflib.count_many("o1000k.ap", reports)
+#
+# each chunk is read (or mapped) once, and searched with every pattern
+# while it is in memory.  the counts are keyed on (name, key) pairs, so
+# the partial results merge like any others; split turns the merged
+# counts into one dictionary per name.  as with a single pattern, the
+# key is whatever findall returns, so a group in the pattern picks out
+# the field to count.  the names are left alone; the keys are bytes (see
+# compat.py).
+
+import re, sys
+from itertools import repeat
+
+from wflib.compat import compile, izip
+
+class Patterns(object):
+
+    def __init__(self, patterns, flags=0):
+        # patterns is a dictionary mapping names to patterns, or a
+        # sequence of (name, pattern) pairs
+        if isinstance(patterns, dict):
+            patterns = sorted(patterns.items())
+        self.patterns = []
+        for name, pat in patterns:
+            self.patterns.append((name, compile(pat, flags)))
+        # used as the marshal-friendly spec (see fromspec), and as the
+        # index key (see index.py)
+        self.pattern = tuple([(name, pat.pattern, pat.flags)
+                              for name, pat in self.patterns])
+        self.flags = 0
+
+    def names(self):
+        return [name for name, pat in self.patterns]
+
+    def findall(self, text, pos=0, endpos=sys.maxsize):
+        result = []
+        for name, pat in self.patterns:
+            result.extend(izip(repeat(name), pat.findall(text, pos, endpos)))
+        return result
+
+def fromspec(spec):
+    # compile a (pattern, flags) spec, as sent to the worker processes
+    pattern, flags = spec
+    if isinstance(pattern, tuple):
+        return Patterns([(name, re.compile(pattern, flags))
+                         for name, pattern, flags in pattern])
+    return re.compile(pattern, flags)
+
+def split(count, names=()):
+    # split merged (name, key) counts into one dictionary per name
+    result = dict((name, {}) for name in names)
+    for (name, key), value in count.items():
+        try:
+            result[name][key] = value
+        except KeyError:
+            result[name] = {key: value}
+    return result
@@ -0,0 +1,355 @@
+# a persistent pool of worker processes.  the process backends normally
+# start a fresh set of workers for every file; a Pool keeps them running
+# (and keeps their memory maps open) between queries:
+#
+#     pool = wflib.Pool(4)
+#     for pattern in patterns:
+#         print pool.find("access.log", pattern)
+#     pool.close()
+#
+# with start="fork", the workers are forked from this process instead of
+# started as new interpreters (see prefork.py).
+
+import os, sys, shutil, tempfile
+import threading, subprocess
+
+from wflib.compat import queue, integer
+from wflib.ipc import getobject, putobject
+from wflib import prefork
+from wflib.shards import Shards
+from wflib.shm import SHMDIR, KeyTable, Packed, SharedBuffer
+from wflib.stats import timer
+
+executable = [sys.executable]
+if sys.platform == "win32":
+    executable.append("-u") # use raw mode on windows
+
+# make sure the worker processes can import this package
+environ = dict(os.environ)
+environ["PYTHONPATH"] = os.pathsep.join(filter(None, [
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    environ.get("PYTHONPATH")
+    ]))
+
+class Batch(object):
+    # collects the results for one set of jobs, in job order.  jobs are
+    # queued one at a time as workers finish, so a lazy job sequence (like
+    # GuidedChunks) sees how much work is left when it hands out the next
+    # job.  the next job is taken without the condition held, so a slow
+    # job sequence (like a streamed file, see compressed.py) doesn't hold
+    # up the results coming in from the other workers.
+
+    def __init__(self, queue, jobs, stats=None):
+        self.cond = threading.Condition()
+        self.feeding = threading.Lock() # held while taking the next job
+        self.queue = queue
+        self.jobs = iter(jobs)
+        self.stats = stats
+        self.pending = 0 # jobs queued or being taken
+        self.seq = 0
+        self.result = {} # seq -> result
+        self.error = None
+
+    def feed(self):
+        # queue the next job, if any
+        self.cond.acquire()
+        try:
+            if self.error is not None:
+                return
+            self.pending += 1
+        finally:
+            self.cond.release()
+        self.take()
+
+    def take(self):
+        # take the next job and queue it, for a worker already counted in
+        # pending (call without the condition held)
+        job = error = None
+        self.feeding.acquire()
+        try:
+            if self.error is None:
+                try:
+                    job = next(self.jobs)
+                except StopIteration:
+                    pass
+                except Exception as v:
+                    error = "cannot get next job: %s" % v
+            if job is not None:
+                self.queue.put((self, self.seq, job))
+                self.seq += 1
+                return
+        finally:
+            self.feeding.release()
+        self.cond.acquire()
+        try:
+            if error is not None and self.error is None:
+                self.error = error
+            self.pending -= 1
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+
+    def start(self, workers):
+        for i in range(workers):
+            self.feed()
+
+    def done(self, seq, result, worker, seconds, error=None):
+        # the worker stays counted in pending while it takes its next job
+        self.cond.acquire()
+        try:
+            if error is None:
+                self.result[seq] = result
+                if self.stats is not None:
+                    self.stats.add(worker, seconds)
+            elif self.error is None:
+                self.error = error
+        finally:
+            self.cond.release()
+        self.take()
+
+    def wait(self):
+        self.cond.acquire()
+        while self.pending:
+            self.cond.wait()
+        self.cond.release()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return [self.result[seq] for seq in sorted(self.result)]
+
+class PoolWorker(threading.Thread):
+    # babysit a worker process, and feed it jobs from the pool queue.
+    # if the process dies, a new one is started for the next job.
+
+    def __init__(self, queue, index=0, transport="marshal", start="exec"):
+        threading.Thread.__init__(self)
+        self.setDaemon(1)
+        self.queue = queue
+        self.index = index
+        self.lock = threading.Lock() # held while talking to the process
+        self.process = None
+        self.buffer = None
+        if transport == "shm":
+            self.buffer = SharedBuffer()
+        elif transport != "marshal":
+            raise ValueError("unknown transport: %r" % transport)
+        prefork.check(start)
+        self.start_method = start
+        self.spawned = self.ready = None # when the process was started,
+                                         # and when it first answered
+        # start right away, so the first job doesn't wait.  this is done
+        # here rather than in run, so a broadcast straight after the pool
+        # is made doesn't start a second process.
+        self.spawn()
+
+    def spawn(self):
+        # a new interpreter by default, which is portable; forking saves
+        # the interpreter startup and the imports (see prefork.py)
+        args = []
+        if self.buffer is not None:
+            args.append(self.buffer.path)
+        self.spawned, self.ready = timer(), None
+        self.keys = KeyTable() # a new process has sent no keys yet
+        if self.start_method == "fork":
+            self.process = prefork.fork(args)
+            return
+        self.process = subprocess.Popen(
+            executable + ["-m", "wflib.worker"] + args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=environ
+            )
+
+    def startup(self):
+        # seconds from spawning the process until it first answered, or
+        # None if it hasn't answered yet
+        if self.ready is None:
+            return None
+        return self.ready - self.spawned
+
+    def send(self, cmd):
+        if self.process is None:
+            self.spawn()
+        putobject(self.process.stdin, cmd)
+
+    def receive(self):
+        # return the next result from the process, or None if it died
+        try:
+            result = getobject(self.process.stdout)
+            if self.ready is None:
+                self.ready = timer()
+            if isinstance(result, integer):
+                result = Packed(self.buffer.read(result), self.keys)
+        except IOError:
+            result = None
+        if result is None:
+            self.process.wait()
+            self.process = None
+        return result
+
+    def run(self):
+        while 1:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch, seq, cmd = item
+            t0 = timer()
+            self.lock.acquire()
+            try:
+                try:
+                    self.send(cmd)
+                except IOError:
+                    pass # receive will notice
+                result = self.receive()
+            finally:
+                self.lock.release()
+            if result is None:
+                batch.done(seq, None, self.index, 0.0, "worker process failed")
+            else:
+                batch.done(seq, result, self.index, timer() - t0)
+        if self.process is not None:
+            putobject(self.process.stdin, None)
+            self.process.wait()
+        if self.buffer is not None:
+            self.buffer.close(remove=True)
+
+def startup(pool, workers, stats=None):
+    # shared by Pool and EventPool
+    pending = [w for w in workers if w.ready is None]
+    if pending:
+        pool.broadcast([("ping",)] * len(workers))
+    result = [w.startup() for w in workers]
+    if stats is not None:
+        for w, seconds in zip(workers, result):
+            stats.started(w.index, seconds)
+    return result
+
+class Pool(object):
+
+    # transport is "marshal" to send results through the worker pipes,
+    # or "shm" to pass them in shared memory (see shm.py).  start is
+    # "exec" to run each worker in a new interpreter, or "fork" to fork
+    # them from this process, after compiling patterns and mapping files
+    # for them (see prefork.py).
+
+    def __init__(self, workers=2, transport="marshal", start="exec",
+                 patterns=(), files=()):
+        prefork.check(start)
+        if start == "fork":
+            prefork.warm(patterns, files)
+        self.queue = queue.Queue()
+        self.threads = []
+        for i in range(max(1, workers)):
+            self.threads.append(PoolWorker(self.queue, i, transport, start))
+        # start the threads after all processes are forked
+        for w in self.threads:
+            w.start()
+
+    def __len__(self):
+        return len(self.threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def map(self, jobs, stats=None):
+        # run a sequence of worker jobs, and return the list of results
+        # (in the same order as the jobs)
+        batch = Batch(self.queue, jobs, stats)
+        batch.start(len(self))
+        return batch.wait()
+
+    def broadcast(self, cmds):
+        # send one command to each worker process, and return the list of
+        # results.  the commands run in parallel.
+        for w in self.threads:
+            w.lock.acquire()
+        try:
+            for w, cmd in zip(self.threads, cmds):
+                w.send(cmd)
+            result = [w.receive() for w in self.threads]
+        finally:
+            for w in self.threads:
+                w.lock.release()
+        if None in result:
+            raise RuntimeError("worker process failed")
+        return result
+
+    def startup(self, stats=None):
+        # return a list with the startup time of each worker process (see
+        # PoolWorker.startup), and add them to stats.  workers that haven't
+        # answered yet are asked to.
+        return startup(self, self.threads, stats)
+
+    def reduce(self, batch):
+        # merge the totals collected for batch in the worker processes,
+        # and return them as disjoint shards (see shards.py)
+        n = len(self)
+        dir = tempfile.mkdtemp(prefix="wflib-", dir=SHMDIR)
+        try:
+            names = self.broadcast([("shard", batch, n, dir)] * n)
+            return Shards(self.broadcast([
+                ("gather", [name[i] for name in names]) for i in range(n)
+                ]))
+        finally:
+            shutil.rmtree(dir, True)
+
+    def discard(self, batch):
+        # drop the totals collected for a batch that failed.  a worker
+        # that fails here has lost them anyway.
+        try:
+            self.broadcast([("discard", batch)] * len(self))
+        except RuntimeError:
+            pass
+
+    def batches(self):
+        # return the batches the worker processes hold totals for
+        result = set()
+        for names in self.broadcast([("batches",)] * len(self)):
+            result.update(names)
+        return sorted(result)
+
+    def count_file(self, file, pattern, backend="mmap", chunksize=None,
+                   **options):
+        from wflib.engines import count_file
+        return count_file(file, pattern, backend, len(self), chunksize,
+                          pool=self, **options)
+
+    def find(self, file, pattern, backend="mmap", chunksize=None, n=10,
+             **options):
+        from wflib.engines import find
+        return find(file, pattern, backend, len(self), chunksize, n,
+                    pool=self, **options)
+
+    def count_many(self, file, patterns, backend="mmap", chunksize=None,
+                   **options):
+        from wflib.engines import count_many
+        return count_many(file, patterns, backend, len(self), chunksize,
+                          pool=self, **options)
+
+    def find_many(self, file, patterns, backend="mmap", chunksize=None, n=10,
+                  **options):
+        from wflib.engines import find_many
+        return find_many(file, patterns, backend, len(self), chunksize, n,
+                         pool=self, **options)
+
+    def count_files(self, paths, pattern, backend="mmap", chunksize=None,
+                    **options):
+        from wflib.engines import count_files
+        return count_files(paths, pattern, backend, len(self), chunksize,
+                           pool=self, **options)
+
+    def find_files(self, paths, pattern, backend="mmap", chunksize=None,
+                   n=10, **options):
+        from wflib.engines import find_files
+        return find_files(paths, pattern, backend, len(self), chunksize, n,
+                          pool=self, **options)
+
+    def close(self):
+        # shut down the workers
+        for w in self.threads:
+            self.queue.put(None)
+        for w in self.threads:
+            w.join()
+        self.threads = []
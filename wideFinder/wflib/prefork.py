@@ -0,0 +1,96 @@
+# preforked workers.  normally every worker process is a fresh
+# interpreter (python -m wflib.worker, like wf-5.py's "--process"), which
+# has to import wflib and compile the pattern before it can take a job.
+# with start="fork", the pools fork their workers from this process
+# instead, so they start out with everything it has already done:
+#
+#     pool = wflib.Pool(4, start="fork", patterns=[pattern],
+#                       files=["o1000k.ap"])
+#
+# the patterns are compiled and the files mapped here first (see warm),
+# so the forked workers find them in the re cache and in process.maps.
+# pool.startup() tells how long each worker took to start, from the
+# spawn until it answered (the stats report shows it too).
+#
+# POSIX only.  a pool forks its workers before it starts its threads; a
+# worker that dies is forked again from a pool thread, which is fine
+# here, since the child only runs the worker loop and never returns.
+
+import os, sys, traceback
+
+from wflib.compat import compile
+
+STARTS = ("exec", "fork")
+
+# pipe ends this process holds for forked workers.  a child closes the
+# ones that belong to its siblings, so they see end of file when this
+# process goes away.
+pipes = set()
+
+class Forked(object):
+    # a forked worker process, with the parts of the Popen interface
+    # that the pools use
+
+    def __init__(self, pid, stdin, stdout):
+        self.pid = pid
+        self.stdin = stdin
+        self.stdout = stdout
+        self.returncode = None
+
+    def wait(self):
+        if self.returncode is None:
+            self.returncode = os.waitpid(self.pid, 0)[1]
+            for f in (self.stdin, self.stdout):
+                pipes.discard(f.fileno())
+                f.close()
+        return self.returncode
+
+def check(start):
+    if start not in STARTS:
+        raise ValueError("unknown start method: %r" % start)
+    if start == "fork" and not hasattr(os, "fork"):
+        raise ValueError("start='fork' needs os.fork")
+
+def warm(patterns=(), files=()):
+    # compile patterns and map files in this process, for workers forked
+    # from it later.  files too large to be mapped as a whole are left
+    # alone (see process.py).
+    from wflib.engines import spec
+    from wflib.multi import fromspec
+    from wflib.process import maps, WINDOW
+    for pat in patterns:
+        fromspec(spec(compile(pat))) # as the worker does it
+    for file in files:
+        if os.path.isfile(file) and os.path.getsize(file) <= WINDOW:
+            maps.get(file)
+
+def fork(args=()):
+    # fork a worker process running the worker loop, with args as its
+    # command line arguments (see worker.py)
+    from wflib import worker
+    r1, w1 = os.pipe() # jobs
+    r2, w2 = os.pipe() # results
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            try:
+                os.close(w1)
+                os.close(r2)
+                for fd in pipes:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+                worker.main(["wflib.worker"] + list(args),
+                            os.fdopen(r1, "rb"), os.fdopen(w2, "wb"))
+                status = 0
+            except:
+                traceback.print_exc()
+                sys.stderr.flush()
+        finally:
+            os._exit(status) # don't run this process's exit handlers
+    os.close(r1)
+    os.close(w2)
+    pipes.update((w1, r2))
+    return Forked(pid, os.fdopen(w1, "wb"), os.fdopen(r2, "rb"))
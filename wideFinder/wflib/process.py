@@ -0,0 +1,133 @@
+# chunk processors.  each one takes a file name, a (start, size) chunk
+# descriptor and a compiled pattern, and returns a dictionary mapping
+# matches to counts.  the keys are what pat.findall would return (bytes,
+# see compat.py).
+
+import os, mmap
+from collections import defaultdict, OrderedDict
+
+from wflib.advise import readchunk, hintmap
+from wflib.columns import process_columns
+from wflib.compressed import process_frames, process_stream, process_text
+from wflib.literal import process_find
+from wflib.vector import process_numpy
+
+def process(file, chunk, pat, io=None):
+    # read the entire chunk and search it in one go (see wf-3.py).  io
+    # is an io strategy (see advise.py)
+    d = defaultdict(int)
+    for page in pat.findall(readchunk(file, chunk, io)):
+        d[page] += 1
+    return d
+
+class MapCache(object):
+    # an LRU cache of read-only memory maps.  maps are keyed on the file's
+    # path, inode, modification time and size, so a rotated or appended
+    # file gets mapped again instead of reusing a stale map.
+
+    def __init__(self, size=8):
+        self.size = size
+        self.maps = OrderedDict()
+
+    def get(self, file):
+        st = os.stat(file)
+        key = os.path.abspath(file), st.st_ino, st.st_mtime, st.st_size
+        try:
+            filemap = self.maps.pop(key)
+        except KeyError:
+            fileobj = open(file, "rb")
+            try:
+                filemap = mmap.mmap(
+                    fileobj.fileno(), st.st_size, access=mmap.ACCESS_READ
+                    )
+            finally:
+                fileobj.close() # the map keeps its own reference
+            while len(self.maps) >= self.size:
+                self.maps.popitem(last=False)[1].close()
+        self.maps[key] = filemap # most recently used last
+        return filemap
+
+    def clear(self):
+        while self.maps:
+            self.maps.popitem()[1].close()
+
+maps = MapCache()
+
+# files larger than this are not mapped as a whole; each chunk maps just
+# the pages it covers instead, so a worker's address space is bounded by
+# the chunk size rather than the file size.
+WINDOW = 64*1024*1024
+
+def mapwindow(file, chunk):
+    # map the pages covering a chunk.  returns the map, and the offset
+    # of the map in the file (which is rounded down to a page boundary).
+    offset = chunk[0] - chunk[0] % mmap.ALLOCATIONGRANULARITY
+    fileobj = open(file, "rb")
+    try:
+        filemap = mmap.mmap(
+            fileobj.fileno(), chunk[0] + chunk[1] - offset,
+            access=mmap.ACCESS_READ, offset=offset
+            )
+    finally:
+        fileobj.close()
+    return filemap, offset
+
+def process_mmap(file, chunk, pat, io=None):
+    # search the chunk directly in a memory-mapped file (see wf-6.py).
+    # small files are mapped as a whole, and the mapping is kept around
+    # for later chunks; large files are mapped one chunk at a time.  io
+    # is an io strategy (see advise.py)
+    d = defaultdict(int)
+    if os.path.getsize(file) <= WINDOW:
+        filemap = maps.get(file)
+        hintmap(filemap, chunk[0], chunk[1], io)
+        for page in pat.findall(filemap, chunk[0], chunk[0]+chunk[1]):
+            d[page] += 1
+    elif chunk[1]:
+        filemap, offset = mapwindow(file, chunk)
+        try:
+            start = chunk[0] - offset
+            hintmap(filemap, start, chunk[1], io)
+            for page in pat.findall(filemap, start, start+chunk[1]):
+                d[page] += 1
+        finally:
+            filemap.close()
+    return d
+
+def process_filter(file, chunk, pat, literal):
+    # two-level filter: only run the RE on lines that contain the
+    # literal (see wf-2.py).  this is a lot faster when few lines match.
+    # lines are split on newlines only, as for the other processors
+    # (splitlines would also split on carriage returns and the like).
+    f = open(file, "rb")
+    f.seek(chunk[0])
+    d = defaultdict(int)
+    findall = pat.findall
+    for line in f.read(chunk[1]).split(b"\n"):
+        if literal in line:
+            for page in findall(line):
+                d[page] += 1
+    f.close()
+    return d
+
+def process_compiled(file, chunk, pat, plan):
+    # count matches using a filter plan from literal.compile
+    if plan[0] == "find":
+        return process_find(file, chunk, pat, *plan[1:])
+    if plan[0] == "lines":
+        return process_filter(file, chunk, pat, plan[1])
+    return process(file, chunk, pat)
+
+# processors that can be called by name from a worker process
+PROCESSORS = {
+    "process": process,
+    "process_mmap": process_mmap,
+    "process_filter": process_filter,
+    "process_find": process_find,
+    "process_compiled": process_compiled,
+    "process_columns": process_columns,
+    "process_numpy": process_numpy,
+    "process_frames": process_frames,
+    "process_text": process_text,
+    "process_stream": process_stream,
+    }
@@ -0,0 +1,51 @@
+# sharded reduction.  normally the parent merges every partial result
+# itself, which gets slow when there are millions of unique keys.  with
+# reduce="shards", the worker processes keep a running total instead of
+# sending back one result per chunk.  when all chunks are done, each
+# worker splits its total into one shard per worker (by a hash of the
+# key), and worker i then merges shard i from every worker.  the merged
+# shards have no keys in common, so the parent only has to concatenate
+# them.
+
+import os, marshal, zlib
+
+def shardof(key, n):
+    # stable across processes (unlike hash, which can be randomized)
+    return (zlib.crc32(marshal.dumps(key)) & 0xffffffff) % n
+
+def shard(count, n, dir, prefix):
+    # split count into n shard files in dir, and return their names
+    shards = [{} for i in range(n)]
+    for key, value in count.items():
+        shards[shardof(key, n)][key] = value
+    names = []
+    for i, d in enumerate(shards):
+        name = os.path.join(dir, "%s-%d-%d" % (prefix, os.getpid(), i))
+        f = open(name, "wb")
+        try:
+            marshal.dump(d, f)
+        finally:
+            f.close()
+        names.append(name)
+    return names
+
+def gather(names):
+    # merge a list of shard files, removing them as we go
+    count = {}
+    for name in names:
+        f = open(name, "rb")
+        try:
+            d = marshal.load(f)
+        finally:
+            f.close()
+        os.remove(name)
+        if not count:
+            count = d
+            continue
+        for key, value in d.items():
+            count[key] = count.get(key, 0) + value
+    return count
+
+class Shards(list):
+    # a list of partial results with disjoint keys (see engines.merge)
+    pass
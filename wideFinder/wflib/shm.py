@@ -0,0 +1,160 @@
+# shared memory result transport.  instead of marshalling every partial
+# result through the worker's stdout pipe, a worker packs it into a
+# shared memory file and only sends the size through the pipe.
+#
+# the keys are interned: each worker numbers the keys it has seen, and a
+# packed result is an array of key ids and an array of counts, followed
+# by the keys the worker hadn't sent before (joined by newlines).  the
+# parent keeps a copy of each worker's key table (KeyTable), so a key is
+# only sent and turned into a Python object once per worker, however
+# many chunks it shows up in.  merge adds the count arrays up by key id
+# (with NumPy, if it's installed), and only looks the totals up by key
+# once per worker at the end, instead of once per key and chunk.
+#
+# the counts are still copied out of the shared file once, since the
+# file is reused for the next result; what's saved is the per-key work.
+# only bytes keys without newlines can be packed; other results (e.g.
+# tuples from patterns with more than one group) are sent as usual.
+
+import os, mmap, struct, tempfile
+from array import array
+
+from wflib.compat import izip, imap, tobytes, frombytes
+
+# number of ids and counts, number of new keys, whether the worker
+# started a new key table, and the size of an id or count
+HEADER = struct.Struct("IIII")
+
+# a worker starts over with a new key table when it gets this large, so a
+# long-lived pool doesn't keep every key it has ever seen
+MAXKEYS = 1 << 20
+
+SHMDIR = None # where to put shared files (None for the default temp dir)
+if os.path.isdir("/dev/shm"):
+    SHMDIR = "/dev/shm"
+
+def pack(d, keyids):
+    # return a packed version of a result dictionary, or None if it
+    # cannot be packed.  keyids maps the keys sent so far to their ids;
+    # it's kept by the worker between results, and updated here.
+    for key in d:
+        if type(key) is not bytes or b"\n" in key:
+            return None
+    reset = len(keyids) + len(d) > MAXKEYS
+    if reset:
+        keyids.clear()
+    ids = array("l")
+    new = []
+    for key in d:
+        i = keyids.get(key)
+        if i is None:
+            i = keyids[key] = len(keyids)
+            new.append(key)
+        ids.append(i)
+    counts = array("l", d.values()) # same order as the keys
+    return (HEADER.pack(len(d), len(new), reset, counts.itemsize) +
+            tobytes(ids) + tobytes(counts) + b"\n".join(new))
+
+class KeyTable(object):
+    # the parent's copy of a worker's interned keys, as a list indexed by
+    # key id.  each worker process has its own; a worker that is started
+    # again gets a new one.
+
+    def __init__(self):
+        self.keys = []
+
+class Packed(object):
+    # a packed result, as returned from a worker process.  the new keys
+    # are added to the worker's key table as the result is unpacked, so
+    # results must be unpacked in the order they arrive.
+
+    def __init__(self, data, table):
+        n, new, reset, itemsize = HEADER.unpack_from(data)
+        pos = HEADER.size
+        self.ids = array("l")
+        self.counts = array("l")
+        if itemsize != self.counts.itemsize:
+            raise ValueError("count size mismatch")
+        frombytes(self.ids, data[pos:pos+n*itemsize])
+        pos += n*itemsize
+        frombytes(self.counts, data[pos:pos+n*itemsize])
+        pos += n*itemsize
+        if reset:
+            table.keys = [] # results unpacked earlier keep the old list
+        if new:
+            table.keys.extend(data[pos:].split(b"\n"))
+        self.keys = table.keys
+
+    def __len__(self):
+        return len(self.counts)
+
+    def items(self):
+        return izip(imap(self.keys.__getitem__, self.ids), self.counts)
+
+def merge(results, count):
+    # add a list of packed results to the count dictionary.  the counts
+    # are added up by key id first, for each key table, and each key is
+    # then looked up once per table.
+    tables = {} # id of key list -> (key list, results)
+    for result in results:
+        tables.setdefault(id(result.keys), (result.keys, []))[1].append(result)
+    try:
+        from wflib.vector import load
+        numpy = load()
+    except ImportError:
+        numpy = None
+    for keys, results in tables.values():
+        if numpy is None:
+            totals = [0] * len(keys)
+            for result in results:
+                for i, value in izip(result.ids, result.counts):
+                    totals[i] += value
+            used = [i for i in range(len(keys)) if totals[i]]
+        else:
+            totals = numpy.zeros(len(keys), numpy.int64)
+            for result in results:
+                numpy.add.at(totals, numpy.frombuffer(result.ids, "l"),
+                             numpy.frombuffer(result.counts, "l"))
+            used = numpy.flatnonzero(totals).tolist()
+            totals = totals.tolist()
+        for i in used:
+            count[keys[i]] += totals[i]
+
+class SharedBuffer(object):
+    # a shared memory file that grows as needed, mapped by both the
+    # worker process (which writes to it) and its babysitter thread
+
+    def __init__(self, path=None):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="wflib-", dir=SHMDIR)
+            os.close(fd)
+        self.path = path
+        self.file = open(path, "r+b")
+        self.map = None
+        self.remap(mmap.PAGESIZE)
+
+    def remap(self, size):
+        if self.map is not None:
+            self.map.close()
+        self.file.seek(0, 2)
+        if self.file.tell() < size:
+            self.file.truncate(size)
+        self.file.seek(0, 2)
+        self.map = mmap.mmap(self.file.fileno(), self.file.tell())
+
+    def write(self, data):
+        if len(data) > len(self.map):
+            # grow geometrically, to avoid remapping for every chunk
+            self.remap(max(len(data), 2 * len(self.map)))
+        self.map[:len(data)] = data
+
+    def read(self, size):
+        if size > len(self.map):
+            self.remap(size) # the worker has grown the file
+        return self.map[:size]
+
+    def close(self, remove=False):
+        self.map.close()
+        self.file.close()
+        if remove:
+            os.remove(self.path)
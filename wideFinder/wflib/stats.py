@@ -0,0 +1,62 @@
+# per-worker statistics.  pass a Stats object to find or count_file to
+# see how busy each worker was; with uneven chunks, the workers that
+# finish early sit idle until the last chunk is done.  the report also
+# gives the throughput, for tuning the io strategy (see advise.py).
+
+import sys, time, threading
+
+if hasattr(time, "perf_counter"):
+    timer = time.perf_counter # python 3
+elif sys.platform == "win32":
+    timer = time.clock
+else:
+    timer = time.time
+
+# processor time of this process (time.clock is gone in python 3.8)
+if hasattr(time, "process_time"):
+    cputime = time.process_time
+else:
+    cputime = time.clock
+
+class Stats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.busy = {} # worker -> seconds spent on jobs
+        self.jobs = {} # worker -> number of jobs
+        self.elapsed = 0.0
+        self.bytes = 0 # size of the files searched
+        self.startup = {} # worker -> seconds to start the process
+
+    def add(self, worker, seconds):
+        self.lock.acquire()
+        try:
+            self.busy[worker] = self.busy.get(worker, 0.0) + seconds
+            self.jobs[worker] = self.jobs.get(worker, 0) + 1
+        finally:
+            self.lock.release()
+
+    def started(self, worker, seconds):
+        if seconds is not None:
+            self.startup[worker] = seconds
+
+    def report(self):
+        # return a list of report lines, one per worker, and one for the
+        # throughput
+        lines = []
+        for worker in sorted(self.busy):
+            busy = self.busy[worker]
+            line = "worker %-3s %4d jobs %10.6f seconds busy" % (
+                worker, self.jobs[worker], busy
+                )
+            if self.elapsed:
+                line += " (%3d%%)" % (100 * busy / self.elapsed)
+            if worker in self.startup:
+                line += ", started in %.6f seconds" % self.startup[worker]
+            lines.append(line)
+        if self.bytes and self.elapsed:
+            mb = self.bytes / 1048576.0
+            lines.append("%.1f MB in %.6f seconds (%.1f MB/s)" % (
+                mb, self.elapsed, mb / self.elapsed
+                ))
+        return lines
@@ -0,0 +1,275 @@
+# regression benchmarks for the wide finder scripts.
+#
+#     python -m wflib.suite [options] [script ...]
+#
+# runs each of the scripts in SCRIPTS (or the ones given) a few times on
+# a generated o1000k.ap of the given size, checks that they all print
+# the same top ten as wflib does, and appends the times to a history
+# file.  then compares the median times with the last run on the same
+# host, python and input, and flags scripts that got slower by more than
+# the threshold.  exits with status 1 if a script failed, printed the
+# wrong result, or got slower.
+#
+# the input is a synthetic log (see generate.py), or o10k.ap repeated
+# with --input repeat, made in a scratch directory; the scripts are run
+# with that as the current directory, so they find it under the name
+# they expect.  pass --dir to keep the input between runs.
+#
+# the README times were taken by hand on one machine in 2007; this is
+# for noticing when a change makes things slower.
+
+from __future__ import print_function
+
+import os, sys, re, json, time, shutil, platform, subprocess, tempfile
+
+from wflib.engines import count_file
+from wflib import generate
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = [
+    "wf-1-gala.py", "wf-2.py", "wf-3.py", "wf-4.py", "wf-5.py", "wf-6.py",
+    "dalke-wf-7.py", "dalke-wf-10.py", "dalke-wf-11.py",
+    ]
+
+# the query the scripts run (see wflib/__main__.py)
+QUERY = r"GET /ongoing/When/\d\d\dx/(\d\d\d\d/\d\d/\d\d/[^ .]+) "
+
+FILE = "o1000k.ap" # the name the scripts read
+SOURCE = os.path.join(HERE, "o10k.ap")
+
+HISTORY = "wf-history.json" # one json record per line
+
+# "key = count" lines, as printed by the scripts
+RESULT = re.compile(r"^\s*(.*\S) = (\d+)\s*$")
+
+INPUTS = ("synthetic", "repeat")
+
+def makeinput(dir, size, input="synthetic", workers=2):
+    # make dir/o1000k.ap, of at least size bytes, unless the same one is
+    # already there.  returns the file name.
+    if input not in INPUTS:
+        raise ValueError("unknown input: %r" % input)
+    file = os.path.join(dir, FILE)
+    description = "%s %d\n" % (input, size)
+    try:
+        f = open(file + ".input")
+        try:
+            if f.read() == description and os.path.isfile(file):
+                return file
+        finally:
+            f.close()
+    except IOError:
+        pass
+    if input == "synthetic":
+        generate.generate(file, size, workers)
+    else:
+        # whole copies of o10k.ap, like getdata.py repeat
+        f = open(SOURCE, "rb")
+        try:
+            data = f.read()
+        finally:
+            f.close()
+        f = open(file, "wb")
+        try:
+            for i in range(max(1, -(-size // len(data)))):
+                f.write(data)
+        finally:
+            f.close()
+    f = open(file + ".input", "w")
+    try:
+        f.write(description)
+    finally:
+        f.close()
+    return file
+
+def reference(file):
+    # the counts the scripts should print, as text.  scripts break ties
+    # in different orders, so this is the whole count, not just the top.
+    count = count_file(file, QUERY, "mmap")
+    return dict((key.decode("latin-1"), value) for key, value in count.items())
+
+def check(output, expected, n=10):
+    # return None if output has a correct top n, or what's wrong with it
+    found = []
+    for line in output.splitlines():
+        m = RESULT.match(line)
+        if m:
+            found.append((m.group(1), int(m.group(2))))
+    top = sorted(expected.values(), reverse=True)[:n]
+    if len(found) != len(top):
+        return "printed %d results, expected %d" % (len(found), len(top))
+    for key, value in found:
+        if expected.get(key) != value:
+            return "%s = %s, expected %s" % (key, value, expected.get(key))
+    if sorted([value for key, value in found], reverse=True) != top:
+        return "not the top %d" % n
+    return None
+
+def run(script, dir, workers, python):
+    # run a script once.  returns wall time, the time the script printed
+    # (or None), and its output.
+    t0 = time.time()
+    p = subprocess.Popen([python, os.path.join(HERE, script), str(workers)],
+                         cwd=dir, stdout=subprocess.PIPE,
+                         stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    wall = time.time() - t0
+    out = out.decode("latin-1")
+    if p.returncode:
+        raise RuntimeError("%s failed:\n%s" % (script, err.decode("latin-1")))
+    elapsed = None
+    try:
+        elapsed = float(out.split(None, 1)[0])
+    except (IndexError, ValueError):
+        pass
+    return wall, elapsed, out
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n // 2]
+    return (values[n // 2 - 1] + values[n // 2]) / 2.0
+
+def host(python):
+    # where the scripts ran, and with which python
+    p = subprocess.Popen([python, "-c", "import platform; print("
+                          "platform.python_version() + ' ' + "
+                          "platform.python_implementation())"],
+                         stdout=subprocess.PIPE)
+    version, implementation = p.communicate()[0].decode("ascii").split()
+    return {
+        "node": platform.node(),
+        "python": version,
+        "implementation": implementation,
+        "platform": platform.platform(),
+        }
+
+def load(history):
+    records = []
+    if os.path.isfile(history):
+        f = open(history)
+        try:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+        finally:
+            f.close()
+    return records
+
+def save(history, record):
+    f = open(history, "a")
+    try:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+    finally:
+        f.close()
+
+def previous(records, record):
+    # the last record comparable with this one
+    for old in reversed(records):
+        if (old["host"] == record["host"] and old["size"] == record["size"]
+            and old["workers"] == record["workers"]
+            and old.get("input", "repeat") == record["input"]):
+            return old
+    return None
+
+def compare(record, old, threshold):
+    # print a report, and return the names of the scripts that got slower
+    slower = []
+    print("%-16s %10s %10s %10s %8s" % (
+        "script", "median", "best", "previous", "change"
+        ))
+    for script in sorted(record["results"]):
+        result = record["results"][script]
+        if "error" in result:
+            print("%-16s %s" % (script, result["error"]))
+            continue
+        line = "%-16s %10.6f %10.6f" % (script, result["median"],
+                                        min(result["times"]))
+        before = old and old["results"].get(script)
+        if before and "median" in before:
+            change = 100.0 * (result["median"] / before["median"] - 1)
+            line += " %10.6f %+7.1f%%" % (before["median"], change)
+            if change > threshold:
+                line += " SLOWER"
+                slower.append(script)
+        print(line)
+    return slower
+
+def main(argv):
+    from optparse import OptionParser
+    parser = OptionParser(usage="%prog [options] [script ...]")
+    parser.add_option("-s", "--size", type="int", default=200,
+                      help="input size in megabytes [%default]")
+    parser.add_option("-i", "--input", default="synthetic",
+                      help="synthetic or repeat (o10k.ap repeated) "
+                      "[%default]")
+    parser.add_option("-r", "--repeat", type="int", default=3,
+                      help="runs per script [%default]")
+    parser.add_option("-w", "--workers", type="int", default=2,
+                      help="thread/process count for wf-4 and later "
+                      "[%default]")
+    parser.add_option("-t", "--threshold", type="float", default=10.0,
+                      help="flag scripts slower than the last run by more "
+                      "than this many percent [%default]")
+    parser.add_option("-H", "--history", default=HISTORY,
+                      help="history file [%default]")
+    parser.add_option("-d", "--dir",
+                      help="keep the input in this directory")
+    parser.add_option("-p", "--python", default=sys.executable,
+                      help="python to run the scripts with [%default]")
+    options, scripts = parser.parse_args(argv[1:])
+    scripts = scripts or SCRIPTS
+
+    dir = options.dir or tempfile.mkdtemp(prefix="wf-suite-")
+    if not os.path.isdir(dir):
+        os.makedirs(dir)
+    try:
+        file = makeinput(dir, options.size * 1024 * 1024, options.input,
+                         options.workers)
+        expected = reference(file)
+        record = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": host(options.python),
+            "size": os.path.getsize(file),
+            "input": options.input,
+            "workers": options.workers,
+            "results": {},
+            }
+        failed = []
+        for script in scripts:
+            result = {"times": [], "wall": []}
+            try:
+                for i in range(options.repeat):
+                    wall, elapsed, out = run(script, dir, options.workers,
+                                             options.python)
+                    error = check(out, expected)
+                    if error:
+                        raise RuntimeError(error)
+                    result["wall"].append(wall)
+                    # the scripts' own times leave out interpreter startup
+                    result["times"].append(elapsed or wall)
+                result["median"] = median(result["times"])
+            except RuntimeError:
+                result = {"error": str(sys.exc_info()[1]).splitlines()[0]}
+                failed.append(script)
+            record["results"][script] = result
+    finally:
+        if not options.dir:
+            shutil.rmtree(dir, True)
+
+    old = previous(load(options.history), record)
+    save(options.history, record)
+    print("%d MB %s input, %d workers, python %s" % (
+        record["size"] // (1024 * 1024), options.input, options.workers,
+        record["host"]["python"]
+        ))
+    slower = compare(record, old, options.threshold)
+    if old is None:
+        print("no earlier run to compare with in %s" % options.history)
+    if failed or slower:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,92 @@
+# approximate top-k counting in bounded memory.  with approximate=k, the
+# engine keeps a Space-Saving summary of at most k keys instead of a
+# count for every unique key.  every backend summarizes each chunk as
+# soon as it's counted (the process backends do it in the worker), so at
+# most k keys per chunk are kept or sent back:
+#
+#     for key, count, error in wflib.find(file, pattern, approximate=1000):
+#         print "%40s = %s (+0/-%s)" % (key, count, error)
+#
+# each reported count is at least the true count, and at most error too
+# high.  a key that isn't in the summary occurs at most floor times.
+
+import heapq
+from operator import itemgetter
+
+from wflib.compat import decode
+
+class SpaceSaving(object):
+    # a mergeable Space-Saving summary (Metwally et al., "Efficient
+    # computation of frequent and top-k elements in data streams")
+
+    def __init__(self, k=1000, counts=None, errors=None, floor=0):
+        self.k = k
+        self.counts = counts or {} # key -> count (an overestimate)
+        self.errors = errors or {} # key -> how much count may be too high
+        self.floor = floor # upper bound for keys that aren't here
+
+    @classmethod
+    def fromdict(cls, d, k=1000):
+        # summarize an exact count
+        self = cls(k, dict(d.items()), None)
+        self.errors = dict.fromkeys(self.counts, 0)
+        self.prune()
+        return self
+
+    def state(self):
+        # marshal-friendly version of the summary
+        return self.counts, self.errors, self.floor
+
+    def prune(self):
+        # drop all but the k largest counts
+        counts = self.counts
+        if len(counts) <= self.k:
+            return
+        keep = heapq.nlargest(self.k, counts.items(), key=itemgetter(1))
+        self.floor = max(self.floor, keep[-1][1])
+        errors = self.errors
+        self.counts = dict(keep)
+        self.errors = dict((key, errors[key]) for key, value in keep)
+
+    def merge(self, other):
+        # add another summary to this one
+        counts, errors = self.counts, self.errors
+        if other.floor:
+            # keys missing from the other summary may have occurred up
+            # to other.floor times there
+            for key in counts:
+                if key not in other.counts:
+                    counts[key] += other.floor
+                    errors[key] += other.floor
+        for key, value in other.counts.items():
+            if key in counts:
+                counts[key] += value
+                errors[key] += other.errors[key]
+            else:
+                counts[key] = value + self.floor
+                errors[key] = other.errors[key] + self.floor
+        self.floor += other.floor
+        self.prune()
+
+    def top(self, n=10):
+        # return the n largest (key, count, error) triples, largest first.
+        # the keys are decoded (see compat.py).
+        errors = self.errors
+        return [(decode(key), value, errors[key]) for key, value in
+                heapq.nlargest(n, self.counts.items(), key=itemgetter(1, 0))]
+
+def summarize_job(k, func, *args):
+    # run a chunk job and return a summary state of its result
+    return SpaceSaving.fromdict(func(*args), k).state()
+
+def summarize(result, k):
+    # fold a list of partial results (dictionaries, Packed results, or
+    # summary states from the workers) into one summary
+    summary = SpaceSaving(k)
+    for item in result:
+        if isinstance(item, tuple):
+            item = SpaceSaving(k, *item)
+        else:
+            item = SpaceSaving.fromdict(item, k)
+        summary.merge(item)
+    return summary
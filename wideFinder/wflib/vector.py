@@ -0,0 +1,158 @@
+# vectorised candidate search with NumPy (optional).  dalke-wf-10.py
+# still calls find twice per match from Python.  here the mapped chunk
+# is viewed as an array of bytes, and the candidate starts, stop
+# characters and newlines are all located in bulk:
+#
+#     starts      offsets where the plan's literal prefix occurs
+#     ends        first stop character after each start, plus the tail
+#     spans       whether there's a newline between start and end; such
+#                 candidates are handed to findall
+#
+# the candidate fields are then gathered into one string with a single
+# fancy-indexing operation and split apart again, and the duplicates are
+# tallied after sorting, so Python only sees each distinct candidate
+# once.  this only works for the "find" plan from literal.py; other
+# patterns are handed to the mmap backend.
+
+import os
+from collections import defaultdict
+from itertools import groupby
+
+numpy = None # imported on first use, so workers start quickly
+
+def load():
+    # import NumPy, if it hasn't been already.  raises ImportError if
+    # it's not installed.
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
+from wflib.advise import hintmap
+from wflib.literal import validate
+
+SPAN = 128 # bytes searched for the stop character in bulk
+BLOCK = 8192 # candidates searched at a time
+SAMPLE = 64*1024 # bytes used to pick the character to scan for
+
+def candidates(buf, prefix):
+    # return the offsets in buf where prefix starts.  the buffer is
+    # scanned for the prefix character that is rarest in a sample of the
+    # buffer, and the other characters are checked at those offsets only
+    n = len(buf) - len(prefix) + 1
+    if n <= 0:
+        return numpy.zeros(0, numpy.intp)
+    freq = numpy.bincount(buf[:SAMPLE], minlength=256)
+    codes = list(bytearray(prefix))
+    k = min(range(len(codes)), key=lambda i: freq[codes[i]])
+    starts = numpy.flatnonzero(buf[k:n+k] == codes[k])
+    for i in range(len(codes)):
+        if not len(starts):
+            break
+        if i != k:
+            starts = starts[buf[starts + i] == codes[i]]
+    return starts
+
+def gather(buf, starts, ends):
+    # return the text between each start and end, as a list of strings
+    if not len(starts):
+        return []
+    lengths = ends - starts + 1 # room for a separator
+    pos = numpy.cumsum(lengths) - lengths
+    index = numpy.arange(lengths.sum()) - numpy.repeat(pos - starts, lengths)
+    numpy.minimum(index, len(buf) - 1, index)
+    text = buf[index]
+    text[pos + lengths - 1] = ord("\n")
+    return text.tobytes().split(b"\n")[:-1]
+
+def stops(buf, starts, skip, stop, tail, find):
+    # return the end of each candidate (or -1 if there is no stop
+    # character after it), and flags for the candidates that may span a
+    # newline.  the stop and newline characters are looked for in a
+    # window of SPAN bytes after each start, a block of candidates at a
+    # time, and with find for the few candidates that are longer.
+    ends = numpy.empty(len(starts), numpy.intp)
+    spans = numpy.empty(len(starts), numpy.bool_)
+    window = numpy.arange(SPAN)
+    for i in range(0, len(starts), BLOCK):
+        offsets = starts[i:i+BLOCK] + skip
+        index = offsets[:, None] + window
+        numpy.minimum(index, len(buf) - 1, index)
+        text = buf[index]
+        hits = text == ord(stop)
+        first = hits.argmax(1)
+        ends[i:i+BLOCK] = numpy.where(hits.any(1), offsets + first + tail, -1)
+        hits = text == ord("\n")
+        newline = numpy.where(hits.any(1), hits.argmax(1), SPAN)
+        spans[i:i+BLOCK] = (newline < first + tail) | (first + tail > SPAN)
+    for i in numpy.flatnonzero(ends == -1).tolist():
+        j = find(stop, starts[i] + skip)
+        if j != -1:
+            ends[i] = j + tail
+            spans[i] = True
+    return ends, spans
+
+def scan(buf, pat, prefix, stop, tail, find, findall, count):
+    # add the matches in buf to count
+    starts = candidates(buf, prefix)
+    ends, special = stops(buf, starts, len(prefix), stop, tail, find)
+    # drop the candidates that don't end inside the buffer
+    keep = (ends != -1) & (ends <= len(buf))
+    starts, ends, special = starts[keep], ends[keep], special[keep]
+    # candidates that overlap the next one, or span a newline, are
+    # searched with findall.  all others are tallied as is, and then
+    # validated (see literal.py)
+    if b"\n" in prefix:
+        special[:] = True
+    overlap = starts[1:] < ends[:-1]
+    special[:-1] |= overlap
+    special[1:] |= overlap
+    raw = {}
+    fields = gather(buf, starts[~special], ends[~special])
+    fields.sort()
+    for key, group in groupby(fields):
+        raw[key] = len(list(group))
+    validate(pat, raw, count)
+    # clusters of special candidates
+    start = end = None
+    for i, j in zip(starts[special].tolist(), ends[special].tolist()):
+        if end is not None and i >= end:
+            findall(start, end)
+            start = None
+        if start is None:
+            start = i
+            end = j
+        else:
+            end = max(end, j)
+    if start is not None:
+        findall(start, end)
+
+def process_numpy(file, chunk, pat, prefix, stop, tail, io=None):
+    # count matches in a mapped chunk using the "find" plan from
+    # literal.compile.  io is an io strategy for maps (see advise.py)
+    from wflib.process import maps, mapwindow, WINDOW
+    load()
+    count = defaultdict(int)
+    if not chunk[1]:
+        return count
+    windowed = os.path.getsize(file) > WINDOW
+    if windowed:
+        filemap, offset = mapwindow(file, chunk)
+    else:
+        filemap, offset = maps.get(file), 0
+    try:
+        start = chunk[0] - offset
+        hintmap(filemap, start, chunk[1], io)
+        buf = numpy.frombuffer(filemap, numpy.uint8, chunk[1], start)
+        def find(text, i):
+            j = filemap.find(text, start + i, start + chunk[1])
+            return j - (j != -1 and start)
+        def findall(i, j):
+            for key in pat.findall(filemap, start + i, start + j):
+                count[key] += 1
+        scan(buf, pat, prefix, stop, tail, find, findall, count)
+        del buf # before the map is closed
+    finally:
+        if windowed:
+            filemap.close()
+    return count
@@ -0,0 +1,110 @@
+# worker process main loop.  started by the process backends as
+#
+#     python -m wflib.worker [buffer]
+#
+# reads (processor, file, chunk, (pattern, flags), args) jobs from stdin
+# and writes the resulting dictionaries to stdout, until it gets None.
+# if a shared buffer file is given, results are packed into that file
+# instead, and only their size is written to stdout (see shm.py).
+#
+# for sharded reduction (see shards.py), a worker also takes
+#
+#     ("collect", batch, processor, file, chunk, (pattern, flags), args)
+#     ("shard", batch, n, dir)
+#     ("gather", names)
+#     ("discard", batch)
+#     ("batches",)
+#
+# to add a chunk's result to a running total for a batch (and reply
+# with an empty dictionary), to split that total into n shard files
+# (and reply with their names), to merge a list of shard files, to drop
+# the total for a batch that failed, and to reply with the list of
+# batches it holds totals for (as "discard" does too).
+#
+#     ("topk", k, processor, file, chunk, (pattern, flags), args)
+#
+# runs a processor and replies with a summary of at most k keys (see
+# topk.py), and
+#
+#     ("ping",)
+#
+# just replies, so a pool can tell when a worker is ready (see
+# Pool.startup), and
+#
+#     ("generate", file, block, blocksize, settings)
+#
+# writes a block of a synthetic log (see generate.py).
+
+import sys
+from collections import defaultdict
+
+from wflib.compat import stdio
+from wflib.generate import generate_block
+from wflib.ipc import getobject, putobject
+from wflib.multi import fromspec
+from wflib.process import PROCESSORS
+from wflib.shards import shard, gather
+from wflib.shm import SharedBuffer, pack
+from wflib.topk import summarize_job
+
+def run(cmd):
+    name, file, chunk, pattern, args = cmd
+    pat = fromspec(pattern)
+    return PROCESSORS[name](file, chunk, pat, *args)
+
+def main(argv, stdin=None, stdout=None):
+    # stdin and stdout are given for forked workers (see prefork.py)
+    if stdin is None:
+        stdin, stdout = stdio()
+    buffer = None
+    if len(argv) > 1:
+        buffer = SharedBuffer(argv[1])
+    totals = {} # batch -> running total
+    keyids = {} # interned keys sent so far (see shm.py)
+    while 1:
+        cmd = getobject(stdin)
+        if cmd is None:
+            break # terminate
+        if cmd[0] == "ping":
+            putobject(stdout, "ready") # started (see pool.startup)
+            continue
+        if cmd[0] == "generate":
+            putobject(stdout, generate_block(*cmd[1:]))
+            continue
+        if cmd[0] == "collect":
+            total = totals.get(cmd[1])
+            if total is None:
+                total = totals[cmd[1]] = defaultdict(int)
+            for key, value in run(cmd[2:]).items():
+                total[key] += value
+            putobject(stdout, {})
+            continue
+        if cmd[0] == "shard":
+            batch, n, dir = cmd[1:]
+            putobject(stdout, shard(totals.pop(batch, {}), n, dir, batch))
+            continue
+        if cmd[0] == "discard":
+            totals.pop(cmd[1], None)
+        if cmd[0] in ("discard", "batches"):
+            putobject(stdout, sorted(totals))
+            continue
+        if cmd[0] == "topk":
+            putobject(stdout, summarize_job(cmd[1], run, cmd[2:]))
+            continue
+        if cmd[0] == "gather":
+            result = gather(cmd[1])
+        else:
+            result = run(cmd)
+        if not isinstance(result, dict):
+            putobject(stdout, result) # not a count (see columns.py)
+            continue
+        if buffer is not None:
+            data = pack(result, keyids)
+            if data is not None:
+                buffer.write(data)
+                putobject(stdout, len(data))
+                continue
+        putobject(stdout, dict(result))
+
+if __name__ == "__main__":
+    main(sys.argv)